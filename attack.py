@@ -1,146 +1,398 @@
+import os
 import sys
-import time
+import json
 import logging
+import argparse
+import functools
+import multiprocessing
 import cypari2
 
-from random import randrange
-from sage.all import *
+from random import Random, seed as python_seed
+from sage.misc.randstate import set_random_seed
 
-import solving_strategy
+import corpus
+import lazylog
+import mlhrsp
+import planner
+import instrumentation
+from mlhrsp import hamming_weight, get_number, generate_MLHRSP_instance
 
-logging.basicConfig(filename='attack.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
-sys.set_int_max_str_digits(0)
 pari = cypari2.Pari()
-pari.allocatemem(10000000000)   
+
+# The largest PARI stack of a process; the stack starts at the size planned by planner.stack_size and grows on demand.
+PARI_STACK_SIZE = planner.MAX_STACK_SIZE
+
+# The file recording the smallest successful s per parameter set, for --s auto.
+S_RECORD_PATH = "adaptive_s.json"
 
 Mersenne_numbers_n = [521, 607, 1279, 2203, 2281, 3217, 4253, 4423, 9689, 9941, 11213, 19937, 21701, 23209, 44497, 86243, 110503, 132049, 216091, 756839]
 
-def hamming_weight(a):
+def attack_MLHRSP_instance(p, h, xi1, xi2, s=5, strategy="basic", reduction_method=None, reduction_options=None, s_start=None, expected=None):
     """
-    Calculate the Hamming weight of an integer.
-    :param a: the integer
-    :return: the number of non-zero bits in the binary representation of the integer
+    Attack a random MLHRSP instance with given set of parameters, see mlhrsp.solve.
+    :param p: the Mersenne prime
+    :param h: the given known parameter
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :param s: the parameter for controlling lattice construction, or "auto" to increase s until the attack succeeds (default: 5)
+    :param strategy: the strategy to use, can be "basic", "improved", or "rational" (default: "basic")
+    :param reduction_method: the lattice reduction method, see small_roots.reduce_lattice (default: None)
+    :param reduction_options: a dict of options for the lattice reduction method (default: None)
+    :param s_start: the first s to try if s is "auto" (default: the theoretical minimum)
+    :param expected: the expected roots (f, g) (default: None)
+    :return: a tuple (1 if attack succeeds else 0, the attack time)
     """
-    count = 0
-    while a:
-        count += a & 1
-        a >>= 1
-    return count
+    result = mlhrsp.solve(p, h, xi1, xi2, s, strategy, expected, reduction_method=reduction_method, reduction_options=reduction_options, s_start=s_start)
+    return int(result.success), result.time
 
-def get_number(n, h):
-    """
-    Generate a random integer with a given number of bits and given Hamming weight.
-    :param n: the number of bits
-    :param h: the Hamming weight
-    :return: the generated random integer
-    """
-    a = 0
-    bit_mask = 1 << (n - 1)
-    a |= bit_mask
-    for _ in range(h - 1):
-        bit_mask = 1 << randrange(n)
-        while a & bit_mask:
-            bit_mask = 1 << randrange(n)
-        a |= bit_mask
-    return a
 
-def generate_MLHRSP_instance(n, w, xi1, xi2, af=1):
+def run_trial(n, w, xi1, xi2, s, strategy, seed, reduction_method=None, reduction_options=None, profile_dir=None, s_start=None, corpus_path=None):
     """
-    Generate a random MLHRSP instances of f, g, and h for a given set of parameters.
+    Generate a seeded MLHRSP instance and attack it.
     :param n: the number of bits for the integers
     :param w: the Hamming weight for f and g
     :param xi1: the exponential parameter for f
     :param xi2: the exponential parameter for g
-    :param af: the achievement factor (default: 1)
-    :return: a tuple (f, g, h) containing the generated instance
-    """
-    p = f = g = h = Integer(1)
-    bf = int(n * xi1)
-    bg = int(n * xi2 * af)
-    logging.info(f"Generating MLHRSP instance with {n}-bit modulus p, {bf}-bit f, {bg}-bit g and Hamming weight {w}...")
-    p = 2 ** n - 1
-    f = get_number(bf, w)
-    g = get_number(bg, w)
-    while gcd(f, g) != 1:
-        g = get_number(bg, w)
-    h = inverse_mod(g, p) * f % p
-    return p, f, g, h
-
-def attack_MLHRSP_instance(p, h, xi1, xi2, s=5, strategy="basic"):
-    """
-    Attack a random MLHRSP instance with given set of parameters.
-    :param p: the Mersenne prime
-    :param h: the given known parameter
+    :param s: the parameter for controlling lattice construction, or "auto"
+    :param strategy: the strategy to use, can be "basic", "improved", or "rational"
+    :param seed: the seed for the random number generators used to generate the instance
+    :param reduction_method: the lattice reduction method, see small_roots.reduce_lattice (default: None)
+    :param reduction_options: a dict of options for the lattice reduction method (default: None)
+    :param profile_dir: if set, the attack is profiled with cProfile and tracemalloc into this directory (default: None)
+    :param s_start: the first s to try if s is "auto" (default: None)
+    :param corpus_path: if set, the instance is read from this corpus instead of generated, and seed is its index (default: None)
+    :return: a tuple (result, test_time, spans), with the result and time as returned by attack_MLHRSP_instance and the recorded stage spans
+    """
+    if corpus_path is not None:
+        seed, p, f, g, h = corpus.open_corpus(corpus_path)[seed]
+    else:
+        python_seed(seed)
+        set_random_seed(seed)
+        p, f, g, h = generate_MLHRSP_instance(n, w, xi1, xi2)
+    instrumentation.reset()
+    with instrumentation.profile(None if profile_dir is None else os.path.join(profile_dir, f"trial-{seed}")):
+        result, test_time = attack_MLHRSP_instance(p, h, xi1, xi2, s, strategy, reduction_method, reduction_options, s_start, (f, g))
+    spans = instrumentation.spans()
+    for record in spans:
+        record["seed"] = seed
+    return result, test_time, spans
+
+
+def _s_record_key(n, w, xi1, xi2, strategy):
+    """
+    :return: the key of a parameter set in the s record file
+    """
+    return f"{n},{w},{xi1},{xi2},{strategy}"
+
+
+def load_minimal_s(path, n, w, xi1, xi2, strategy):
+    """
+    Looks up the smallest s that succeeded before for a parameter set.
+    :param path: the record file
+    :param n: the Mersenne exponent
+    :param w: the Hamming weight of f and g
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :param strategy: the strategy
+    :return: the recorded s, or None
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file).get(_s_record_key(n, w, xi1, xi2, strategy))
+
+
+def save_minimal_s(path, n, w, xi1, xi2, strategy, s):
+    """
+    Records the smallest s that succeeded for a parameter set, replacing the file atomically.
+    :param path: the record file
+    :param n: the Mersenne exponent
+    :param w: the Hamming weight of f and g
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :param strategy: the strategy
+    :param s: the smallest successful s
+    """
+    record = {}
+    if os.path.exists(path):
+        with open(path) as file:
+            record = json.load(file)
+    record[_s_record_key(n, w, xi1, xi2, strategy)] = s
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(record, file, indent=1, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+def configure():
+    """
+    Configures the process for the command line tools: debug logging to attack.log and printing of big integers.
+    """
+    logging.basicConfig(filename='attack.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.set_int_max_str_digits(0)
+
+
+def _init_worker(stack_size, stack_size_max=0):
+    """
+    Initializes a worker process of the trial pool with its own PARI stack.
+    :param stack_size: the PARI stack size in bytes for this worker
+    :param stack_size_max: the size in bytes the stack may grow to on demand, or 0 for a fixed stack (default: 0)
+    """
+    pari.allocatemem(stack_size, stack_size_max, silent=True)
+
+
+def _parse_s(value):
+    """
+    :return: the s argument as an integer, or "auto"
+    """
+    return value if value == "auto" else int(value)
+
+
+def parse_arguments(argv=None):
+    """
+    Parses the command line arguments, asking for the attack parameters interactively if none are given.
+    :param argv: the command line arguments (default: sys.argv[1:])
+    :return: the parsed arguments
+    """
+    import small_roots
+
+    parser = argparse.ArgumentParser(description="Lattice-based attacks on the Mersenne Low Hamming Ratio Search Problem.")
+    parser.add_argument("n", type=int, nargs="?", help="the Mersenne exponent")
+    parser.add_argument("w", type=int, nargs="?", help="the Hamming weight of f and g")
+    parser.add_argument("xi1", type=float, nargs="?", help="the exponential parameter for f")
+    parser.add_argument("xi2", type=float, nargs="?", help="the exponential parameter for g")
+    parser.add_argument("s", type=_parse_s, nargs="?", help="the parameter for controlling lattice construction, or auto to increase it until the attack succeeds")
+    parser.add_argument("test_times", type=int, nargs="?", default=5, help="the number of trials (default: 5)")
+    parser.add_argument("strategy", nargs="?", default="basic", help="the solving strategy, basic, improved or rational (default: basic)")
+    parser.add_argument("--jobs", type=int, default=1, help="the number of worker processes running trials in parallel (default: 1)")
+    parser.add_argument("--seed", type=int, default=None, help="the seed from which the per-trial seeds are derived (default: random)")
+    parser.add_argument("--reduction", choices=sorted(small_roots.REDUCTION_METHODS), default=None, help="the lattice reduction method (default: flatter if available in small_roots, else lll)")
+    parser.add_argument("--variant", choices=sorted(small_roots.LLL_VARIANTS), default=None, help="the fplll LLL variant for the lll and partial methods")
+    parser.add_argument("--fp", choices=small_roots.FP_TYPES, default=None, help="the floating point type of Sage's LLL and BKZ: fp (double), ld (long double), qd (quad double), xd (double with extended exponent) or rr (arbitrary precision)")
+    parser.add_argument("--prec", type=int, default=None, help="the floating point precision in bits for --fp rr")
+    parser.add_argument("--block-size", type=int, default=None, help="the block size for the bkz method")
+    parser.add_argument("--rows", type=int, default=None, help="the number of rows which must be short for the partial method to stop early")
+    parser.add_argument("--profile", metavar="DIR", default=None, help="profile every trial with cProfile and tracemalloc into this directory")
+    parser.add_argument("--stages-json", metavar="PATH", default=None, help="export the per-stage spans of all trials as JSON")
+    parser.add_argument("--stages-csv", metavar="PATH", default=None, help="export the per-stage spans of all trials as CSV")
+    parser.add_argument("--s-record", metavar="PATH", default=S_RECORD_PATH, help=f"the file recording the smallest successful s per parameter set for s = auto (default: {S_RECORD_PATH})")
+    parser.add_argument("--batch", metavar="PATH", default=None, help="solve the h values in this file (- for standard input) for p = 2^n - 1 instead of generating instances, printing one JSON line per result")
+    parser.add_argument("--binary", action="store_true", help="read the batch h values as consecutive little-endian integers of ceil(n / 8) bytes instead of one per line")
+    parser.add_argument("--memory-budget", type=planner.parse_size, metavar="SIZE", default=None, help="the memory budget of a trial, e.g. 2G; attacks predicted to exceed it are refused")
+    parser.add_argument("--down-scale", action="store_true", help="lower s until the attack fits the memory budget instead of refusing it")
+    parser.add_argument("--corpus", metavar="PATH", default=None, help="attack the instances of this corpus (see corpus.py) instead of generating them")
+    parser.add_argument("--power-of-two", action="store_true", help="round the root bounds up to powers of two, so the lattice column scalings are shifts")
+    parser.add_argument("--dump-values", metavar="PATH", default=None, help="append the full values of the found roots to this binary file (the log only has summaries)")
+    args = parser.parse_args(argv)
+    if args.n is not None and args.s is None:
+        parser.error("Wrong arguments! Please check and input suitable parameters.")
+    if args.reduction is not None:
+        unsupported = set(reduction_options(args)) - small_roots.REDUCTION_OPTIONS[args.reduction]
+        if unsupported:
+            parser.error(f"The {args.reduction} reduction method does not accept {', '.join('--' + name.replace('_', '-') for name in sorted(unsupported))}.")
+    if args.jobs < 1:
+        parser.error("The number of jobs must be positive.")
+
+    if args.n is None:
+        print(f"Example Mersenne n: {Mersenne_numbers_n}...")
+        args.n = int(input("Input n (choosing from aboves): "))
+        args.w = int(input("Input w (satisfying 4*w^2 < n): "))
+        args.xi1 = float(input("Input xi1 (0 to 1 & xi1+xi2=1): "))
+        args.xi2 = float(input("Input xi2 (0 to 1 & xi1+xi2=1): "))
+        args.s = _parse_s(input("Input s (controlling lattices, or auto): "))
+        args.test_times = int(input("Input test times (for attacks): "))
+        args.strategy = input("Input type (basic, improved or rational): ")
+    return args
+
+
+def reduction_options(args):
+    """
+    Collects the options of the lattice reduction method from the parsed arguments.
+    :param args: the parsed arguments
+    :return: a dict of options for the lattice reduction method
+    """
+    options = {"variant": args.variant, "fp": args.fp, "prec": args.prec, "block_size": args.block_size, "rows": args.rows}
+    return {name: value for name, value in options.items() if value is not None}
+
+
+def plan_trial(n, xi1, xi2, s, strategy, reduction_method=None, budget=None, down_scale=False, s_start=None):
+    """
+    Plans the memory of the trials of a parameter set, see planner.plan, so every tool picks the same reduction method.
+    For s = auto the plan is for the first s tried, since the adaptive search only grows the lattice when it fails.
+    :param n: the Mersenne exponent
     :param xi1: the exponential parameter for f
     :param xi2: the exponential parameter for g
-    :param s: the parameter for controlling lattice construction (default: 5)
-    :param strategy: the strategy to use, can be "basic", or "improved" (default: "basic")
-    :return: 1 if attack succeeds else 0
-    """
-    assert strategy == "basic" or strategy == "improved", f"Solving strategy is not defined! Please input a correct strategy name."
-    if strategy == "basic":
-        logging.info("Using basic solving strategy to find roots...")
-        start_time = time.perf_counter()
-        fs, gs = solving_strategy.basic_attack(p, h, xi1, xi2, s)
-        end_time = time.perf_counter()
-        test_time = end_time - start_time
-    elif strategy == "improved":
-        logging.info("Using improved solving strategy to find roots...")
-        start_time = time.perf_counter()
-        fs, gs = solving_strategy.improved_attack(p, h, xi1, xi2, s)
-        end_time = time.perf_counter()
-        test_time = end_time - start_time
-    if fs is not None and gs is not None and fs == f and gs == g:
-        logging.info(f"Succeeded!")
-        logging.info(f"Found f = {fs}")
-        logging.info(f"Found g = {gs}")
-        return 1, test_time
+    :param s: the s value, or "auto"
+    :param strategy: the strategy, can be "basic", "improved", or "rational"
+    :param reduction_method: the lattice reduction method, or None to use the planned one (default: None)
+    :param budget: the memory budget of a trial in bytes (default: None)
+    :param down_scale: set to true to lower s until the attack fits the budget (default: False)
+    :param s_start: the first s to try if s is "auto" (default: None)
+    :return: a tuple of the plan and the reduction method to use
+    :raises MemoryError: if the attack does not fit the budget
+    """
+    import small_roots
+    import solving_strategy
+
+    planned_s = s
+    if s == "auto":
+        planned_s = s_start or solving_strategy.minimal_s(n, xi1, xi2, strategy) or solving_strategy.S_MAX
+    memory_plan = planner.plan(n, xi1, xi2, planned_s, strategy, reduction_method, budget, down_scale and s != "auto")
+    if reduction_method is None and (memory_plan["reduction_method"] != "flatter" or small_roots.USE_FLATTER):
+        reduction_method = memory_plan["reduction_method"]
+    return memory_plan, reduction_method
+
+
+def plan_memory(args, s_start=None):
+    """
+    Plans the memory of the attacks from the parsed arguments, see plan_trial.
+    :param args: the parsed arguments
+    :param s_start: the first s to try if s is "auto" (default: None)
+    :return: a tuple of the plan, the s and the reduction method to use
+    """
+    try:
+        memory_plan, reduction_method = plan_trial(args.n, args.xi1, args.xi2, args.s, args.strategy, args.reduction, args.memory_budget, args.down_scale, s_start)
+    except (MemoryError, ValueError) as error:
+        logging.error(str(error))
+        raise SystemExit(str(error))
+
+    logging.info(f"Planned lattice of dimension {memory_plan['dimension']} with entries up to {memory_plan['max_bits']} bits, {memory_plan['reduction_method']} reduction, a {memory_plan['stack_size'] / 2 ** 20:.0f} MiB PARI stack and a peak of {memory_plan['memory'] / 2 ** 20:.1f} MiB")
+    s = args.s
+    if args.s != "auto" and memory_plan["s"] != args.s:
+        print(f"Down-scaled s from {args.s} to {memory_plan['s']} to fit the memory budget...")
+        s = memory_plan["s"]
+    return memory_plan, s, reduction_method
+
+
+def _stack_sizes(memory_plan, jobs, budget=None):
+    """
+    :return: the initial and maximum PARI stack size of each of jobs processes, within the memory budget
+    """
+    stack_size_max = PARI_STACK_SIZE // jobs if budget is None else min(budget, PARI_STACK_SIZE // jobs)
+    return memory_plan["stack_size"], max(memory_plan["stack_size"], stack_size_max)
+
+
+def grid_stack_sizes(cells, jobs):
+    """
+    Sizes the PARI stacks of processes running trials of several parameter sets, e.g. a sweep or a benchmark.
+    :param cells: a list of dicts with the n, xi1, xi2, s, strategy and optionally the reduction of every parameter set
+    :param jobs: the number of processes
+    :return: the initial and maximum PARI stack size of each process, see _stack_sizes
+    """
+    plans = [plan_trial(cell["n"], cell["xi1"], cell["xi2"], cell["s"], cell["strategy"], cell.get("reduction"))[0] for cell in cells]
+    largest = max(plans, key=lambda memory_plan: memory_plan["stack_size"], default={"stack_size": planner.MIN_STACK_SIZE})
+    return _stack_sizes(largest, jobs)
+
+
+def run_batch(args):
+    """
+    Solves a stream of h values for the same parameters, printing one JSON line per h value as it finishes.
+    :param args: the parsed arguments
+    """
+    p = 2 ** args.n - 1
+    width = (args.n + 7) // 8 if args.binary else None
+    memory_plan, s, reduction_method = plan_memory(args)
+    stack_sizes = _stack_sizes(memory_plan, args.jobs, args.memory_budget)
+    if args.jobs == 1:
+        _init_worker(*stack_sizes)
+
+    solved = total = 0
+    with sys.stdin.buffer if args.batch == "-" else open(args.batch, "rb") as file:
+        hs = mlhrsp.read_h_values(file, width)
+        results = mlhrsp.solve_batch(p, hs, args.xi1, args.xi2, s, args.strategy, args.jobs, initializer=_init_worker, initargs=stack_sizes, reduction_method=reduction_method, reduction_options=reduction_options(args))
+        for index, h, result in results:
+            total += 1
+            solved += result.success
+            f = None if result.f is None else int(result.f)
+            g = None if result.g is None else int(result.g)
+            print(json.dumps({"index": index, "success": result.success, "f": f, "g": g, "time": result.time}), flush=True)
+    logging.info(f"Solved {solved} of {total} h values for n={args.n}, xi1={args.xi1}, xi2={args.xi2} using s={s} and {args.strategy} strategy...")
+    print(f"Solved {solved} of {total} h values...", file=sys.stderr)
+
+
+def main():
+    configure()
+    args = parse_arguments()
+    lazylog.DUMP_PATH = args.dump_values
+    if args.power_of_two:
+        import solving_strategy
+
+        solving_strategy.POWER_OF_TWO_BOUNDS = True
+    if args.batch is not None:
+        run_batch(args)
+        return
+    n, w, xi1, xi2, test_times, strategy = args.n, args.w, args.xi1, args.xi2, args.test_times, args.strategy
+
+    s_start = None
+    if args.s == "auto":
+        s_start = load_minimal_s(args.s_record, n, w, xi1, xi2, strategy)
+    memory_plan, s, reduction_method = plan_memory(args, s_start)
+    stack_sizes = _stack_sizes(memory_plan, args.jobs, args.memory_budget)
+
+    if args.corpus is not None:
+        instances = corpus.open_corpus(args.corpus)
+        if (instances.n, instances.w, instances.xi1, instances.xi2) != (n, w, xi1, xi2):
+            raise SystemExit(f"The corpus has n={instances.n}, w={instances.w}, xi1={instances.xi1}, xi2={instances.xi2}, not the given parameters.")
+        test_times = min(test_times, len(instances))
+        # The trials take the first instances of the corpus, so runs with different s, strategies or reduction methods share them.
+        seeds = list(range(test_times))
     else:
-        logging.info(f"Failed!")
-        return 0, test_time
-
-
-assert len(sys.argv) == 1 or 6 <= len(sys.argv) <= 8, f"Wrong arguments! Please check and input suitable parameters."
-if len(sys.argv) == 1:
-    print(f"Example Mersenne n: {Mersenne_numbers_n}...")
-    n = int(input("Input n (choosing from aboves): "))
-    w = int(input("Input w (satisfying 4*w^2 < n): "))
-    xi1 = float(input("Input xi1 (0 to 1 & xi1+xi2=1): "))
-    xi2 = float(input("Input xi2 (0 to 1 & xi1+xi2=1): "))
-    s = int(input("Input s (controlling lattices): "))
-    test_times = int(input("Input test times (for attacks): "))
-    strategy = input("Input type (basic or improved): ")
-else:
-    n = int(sys.argv[1])
-    w = int(sys.argv[2])
-    xi1 = float(sys.argv[3])
-    xi2 = float(sys.argv[4])
-    s = int(sys.argv[5])
-    if len(sys.argv) >= 7:
-        test_times = int(sys.argv[6])
+        rng = Random(args.seed)
+        seeds = [rng.randrange(2 ** 64) for _ in range(test_times)]
+    trial = functools.partial(run_trial, n, w, xi1, xi2, s, strategy, reduction_method=reduction_method, reduction_options=reduction_options(args), profile_dir=args.profile, s_start=s_start, corpus_path=args.corpus)
+
+    logging.info(f"Test with n={n}, w={w}, xi1={xi1}, xi2={xi2}, and s={s} for {test_times} times using {args.jobs} jobs:")
+    total_time = 0
+    results = []
+    spans = []
+
+    if args.jobs == 1:
+        _init_worker(*stack_sizes)
+        outcomes = map(trial, seeds)
     else:
-        test_times = 5
-    if len(sys.argv) == 8:
-        strategy = sys.argv[7]
+        # Every worker starts with the planned stack, and may only grow it to its share of the whole allocation.
+        context = multiprocessing.get_context("fork")
+        pool = context.Pool(args.jobs, initializer=_init_worker, initargs=stack_sizes)
+        outcomes = pool.imap_unordered(trial, seeds)
+
+    for result, test_time, trial_spans in outcomes:
+        spans.extend(trial_spans)
+        if result:
+            total_time += test_time
+            results.append(result)
+
+    if args.jobs > 1:
+        pool.close()
+        pool.join()
+
+    if len(results) == 0:
+        logging.info(f"The success rate for n={n}, w={w}, xi1={xi1}, xi2={xi2} using s={s} and {strategy} strategy is 0%...")
+        print(f"The success rate for n={n}, w={w}, xi1={xi1}, xi2={xi2} using s={s} and {strategy} strategy is 0%...")
     else:
-        strategy = "basic"
-
-logging.info(f"Test with n={n}, w={w}, xi1={xi1}, xi2={xi2}, and s={s} for {test_times} times:")
-total_time = 0
-results = []
-
-for i in range(test_times):
-    p, f, g, h = generate_MLHRSP_instance(n, w, xi1, xi2)
-    result, test_time = attack_MLHRSP_instance(p, h, xi1, xi2, s, strategy)
-    if result:
-        total_time += test_time
-        results.append(result)
-
-if len(results) == 0:
-    logging.info(f"The success rate for n={n}, w={w}, xi1={xi1}, xi2={xi2} using s={s} and {strategy} strategy is 0%...")
-    print(f"The success rate for n={n}, w={w}, xi1={xi1}, xi2={xi2} using s={s} and {strategy} strategy is 0%...")
-else:
-    logging.info(f"Success rate for n={n}, w={w}, xi1={xi1}, xi2={xi2} using s={s} and {strategy} strategy is {sum(results)/test_times*100}%...")
-    print(f"Success rate for n={n}, w={w}, xi1={xi1}, xi2={xi2} using s={s} and {strategy} strategy is {sum(results)/test_times*100}%...")
-    avg_time = total_time / len(results)
-    print(f"Average time is {avg_time:.3f} seconds...")
+        logging.info(f"Success rate for n={n}, w={w}, xi1={xi1}, xi2={xi2} using s={s} and {strategy} strategy is {sum(results)/test_times*100}%...")
+        print(f"Success rate for n={n}, w={w}, xi1={xi1}, xi2={xi2} using s={s} and {strategy} strategy is {sum(results)/test_times*100}%...")
+        avg_time = total_time / len(results)
+        print(f"Average time is {avg_time:.3f} seconds...")
+
+    if s == "auto":
+        successes = [record["s"] for record in spans if record["name"] == "verify" and record.get("success")]
+        if successes:
+            print(f"Smallest successful s is {min(successes)}...")
+            save_minimal_s(args.s_record, n, w, xi1, xi2, strategy, min(successes))
+
+    if spans:
+        actual = max(record["peak_rss"] for record in spans)
+        logging.info(f"Predicted peak memory is {memory_plan['memory'] / 2 ** 20:.1f} MiB, actual peak RSS is {actual / 2 ** 20:.1f} MiB")
+        print(f"Predicted peak memory is {memory_plan['memory'] / 2 ** 20:.1f} MiB, actual peak RSS is {actual / 2 ** 20:.1f} MiB...")
+
+    stages = instrumentation.summary(spans)
+    breakdown = instrumentation.format_summary(stages, test_times)
+    logging.info(f"Per-stage breakdown:\n{breakdown}")
+    print(f"Per-stage breakdown:\n{breakdown}")
+    if args.stages_json is not None:
+        instrumentation.to_json(args.stages_json, spans)
+    if args.stages_csv is not None:
+        instrumentation.to_csv(args.stages_csv, spans)
+
+
+if __name__ == "__main__":
+    main()
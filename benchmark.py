@@ -0,0 +1,196 @@
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+
+import attack
+import instrumentation
+
+# The instance seeds of every benchmark case, so all cases with the same n, w, xi1 and xi2 attack the same instances.
+SEEDS = [1, 2, 3, 4, 5]
+
+# The default benchmark matrix, one dict per case.
+MATRIX = [
+    {"n": 521, "w": 10, "xi1": 0.5, "xi2": 0.5, "s": 5, "strategy": "basic", "reduction": "lll"},
+    {"n": 521, "w": 10, "xi1": 0.5, "xi2": 0.5, "s": 5, "strategy": "improved", "reduction": "lll"},
+    {"n": 521, "w": 10, "xi1": 0.75, "xi2": 0.25, "s": 7, "strategy": "improved", "reduction": "lll"},
+    {"n": 521, "w": 10, "xi1": 0.5, "xi2": 0.5, "s": 5, "strategy": "improved", "reduction": "flatter"},
+    # Even bounds, so the lattice has a power of two content which reduce_lattice factors out.
+    {"n": 607, "w": 10, "xi1": 0.5, "xi2": 0.5, "s": 5, "strategy": "improved", "reduction": "partial"},
+    {"n": 1279, "w": 10, "xi1": 0.5, "xi2": 0.5, "s": 5, "strategy": "improved", "reduction": "flatter"},
+    {"n": 4253, "w": 10, "xi1": 0.5, "xi2": 0.5, "s": 5, "strategy": "rational", "reduction": None},
+]
+
+# Timings below this many seconds are too noisy to be flagged as regressions.
+MIN_TIME = 0.01
+
+
+def case_key(case):
+    """
+    Returns the key identifying a benchmark case, used to match a run against a baseline.
+    :param case: a dict with the n, w, xi1, xi2, s, strategy and reduction of the case
+    :return: a string key
+    """
+    return f"n={case['n']} w={case['w']} xi1={case['xi1']} xi2={case['xi2']} s={case['s']} {case['strategy']} {case.get('reduction')}"
+
+
+def percentile(values, q):
+    """
+    Computes a percentile with the nearest-rank method.
+    :param values: the values
+    :param q: the percentile, in [0, 100]
+    :return: the percentile, or None if there are no values
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, -(-len(values) * q // 100) - 1)]
+
+
+def run_case_trial(task):
+    """
+    Runs one seeded trial of a benchmark case.
+    :param task: a tuple (case, seed)
+    :return: a dict with the success, total time, per-stage times and peak RSS of the trial
+    """
+    case, seed = task
+    _, reduction_method = attack.plan_trial(case["n"], case["xi1"], case["xi2"], case["s"], case["strategy"], case.get("reduction"))
+    result, test_time, spans = attack.run_trial(case["n"], case["w"], case["xi1"], case["xi2"], case["s"], case["strategy"], seed, reduction_method=reduction_method)
+    stages = instrumentation.summary(spans)
+    return {
+        "seed": seed,
+        "success": bool(result),
+        "time": test_time,
+        "stages": {name: stage["time"] for name, stage in stages.items()},
+        "peak_rss": max((stage["peak_rss"] for stage in stages.values()), default=instrumentation.peak_rss()),
+    }
+
+
+def run_case(case, seeds, jobs=1):
+    """
+    Runs a benchmark case on all seeds and aggregates its timings.
+    Every trial runs in a fresh worker process, so the peak RSS of a trial does not include the earlier trials.
+    :param case: a dict with the n, w, xi1, xi2, s, strategy and reduction of the case
+    :param seeds: the instance seeds
+    :param jobs: the number of worker processes; timings are only comparable between runs with the same value (default: 1)
+    :return: a dict with the case, the success rate, the median and p95 total and per-stage times, and the peak RSS
+    """
+    context = multiprocessing.get_context("fork")
+    with context.Pool(jobs, initializer=attack._init_worker, initargs=attack.grid_stack_sizes([case], jobs), maxtasksperchild=1) as pool:
+        trials = pool.map(run_case_trial, [(case, seed) for seed in seeds])
+
+    stages = {}
+    for trial in trials:
+        for name, stage_time in trial["stages"].items():
+            stages.setdefault(name, []).append(stage_time)
+    times = [trial["time"] for trial in trials]
+    return {
+        "case": case,
+        "trials": len(trials),
+        "success_rate": sum(trial["success"] for trial in trials) / len(trials),
+        "time": {"median": percentile(times, 50), "p95": percentile(times, 95)},
+        "stages": {name: {"median": percentile(values, 50), "p95": percentile(values, 95)} for name, values in stages.items()},
+        "peak_rss": max(trial["peak_rss"] for trial in trials),
+    }
+
+
+def run_benchmark(matrix, seeds, jobs=1):
+    """
+    Runs all benchmark cases.
+    :param matrix: a list of benchmark cases
+    :param seeds: the instance seeds
+    :param jobs: the number of worker processes (default: 1)
+    :return: the benchmark results, a dict with the seeds and a list of case results, see run_case
+    """
+    cases = []
+    for case in matrix:
+        logging.info(f"Benchmarking {case_key(case)}...")
+        cases.append(run_case(case, seeds, jobs))
+    return {"seeds": list(seeds), "jobs": jobs, "cases": cases}
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    Compares benchmark results with a baseline.
+    A case regresses if its success rate drops, or if its median total time, a median stage time or its peak RSS
+    grows by more than the threshold. Times below MIN_TIME are ignored.
+    :param results: the benchmark results
+    :param baseline: the baseline results
+    :param threshold: the allowed relative growth (default: 0.2)
+    :return: a list of regression messages
+    """
+    baseline_cases = {case_key(case["case"]): case for case in baseline["cases"]}
+    regressions = []
+    for current in results["cases"]:
+        key = case_key(current["case"])
+        previous = baseline_cases.get(key)
+        if previous is None:
+            continue
+        if current["success_rate"] < previous["success_rate"]:
+            regressions.append(f"{key}: success rate {previous['success_rate'] * 100:.1f}% -> {current['success_rate'] * 100:.1f}%")
+        metrics = [("time", previous["time"]["median"], current["time"]["median"])]
+        for name, stage in current["stages"].items():
+            if name in previous["stages"]:
+                metrics.append((name, previous["stages"][name]["median"], stage["median"]))
+        for name, old, new in metrics:
+            if new > MIN_TIME and new > old * (1 + threshold):
+                regressions.append(f"{key}: median {name} {old:.3f} -> {new:.3f} seconds")
+        if current["peak_rss"] > previous["peak_rss"] * (1 + threshold):
+            regressions.append(f"{key}: peak RSS {previous['peak_rss'] / 2 ** 20:.1f} -> {current['peak_rss'] / 2 ** 20:.1f} MiB")
+    return regressions
+
+
+def format_results(results):
+    """
+    Formats benchmark results, one block per case.
+    :param results: the benchmark results
+    :return: the formatted results
+    """
+    lines = []
+    for case in results["cases"]:
+        lines.append(f"{case_key(case['case'])}: success rate {case['success_rate'] * 100:.1f}%, median {case['time']['median']:.3f} seconds, p95 {case['time']['p95']:.3f} seconds, peak RSS {case['peak_rss'] / 2 ** 20:.1f} MiB")
+        for name, stage in case["stages"].items():
+            lines.append(f"{name:>12}: median {stage['median']:.3f} seconds, p95 {stage['p95']:.3f} seconds")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproducible benchmarks of the MLHRSP attacks.")
+    parser.add_argument("--matrix", help="a JSON file with a list of cases (keys n, w, xi1, xi2, s, strategy, reduction)")
+    parser.add_argument("--seeds", type=int, nargs="+", default=SEEDS, help=f"the instance seeds (default: {SEEDS})")
+    parser.add_argument("--jobs", type=int, default=1, help="the number of worker processes (default: 1)")
+    parser.add_argument("--save", metavar="PATH", help="save the results as a JSON baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="compare the results with a JSON baseline and exit with 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="the allowed relative growth before a regression is flagged (default: 0.2)")
+    args = parser.parse_args()
+    attack.configure()
+
+    matrix = MATRIX
+    if args.matrix is not None:
+        with open(args.matrix) as file:
+            matrix = json.load(file)
+
+    start_time = time.perf_counter()
+    results = run_benchmark(matrix, args.seeds, args.jobs)
+    end_time = time.perf_counter()
+    print(format_results(results))
+    print(f"Ran {len(matrix)} cases within {end_time - start_time:.3f} seconds...")
+
+    if args.save is not None:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=1)
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"No regressions beyond {args.threshold * 100:.0f}%...")
+
+
+if __name__ == "__main__":
+    main()
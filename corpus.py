@@ -0,0 +1,138 @@
+import mmap
+import struct
+import logging
+import argparse
+import functools
+import multiprocessing
+
+from random import Random, seed as python_seed
+from sage.misc.randstate import set_random_seed
+from sage.rings.integer import Integer
+
+import mlhrsp
+from low_weight import LowWeightInteger
+
+MAGIC = b"MLHRSPC1"
+
+# The header: magic, n, w, xi1, xi2, the number of instances and the offset of the index, all little-endian.
+HEADER = struct.Struct("<8sIIddQQ")
+
+# The start of an instance: its seed and the number of bit positions of f and g, followed by the positions
+# (4 bytes each) and h as ceil(n / 8) little-endian bytes. The index is one 8-byte offset per instance.
+RECORD = struct.Struct("<QII")
+
+
+def generate_instance(n, w, xi1, xi2, seed):
+    """
+    Generates a seeded MLHRSP instance, exactly as attack.run_trial does.
+    :param n: the Mersenne exponent
+    :param w: the Hamming weight of f and g
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :param seed: the seed
+    :return: a tuple (seed, f, g, h)
+    """
+    python_seed(seed)
+    set_random_seed(seed)
+    _, f, g, h = mlhrsp.generate_MLHRSP_instance(n, w, xi1, xi2)
+    return seed, f, g, h
+
+
+def write_corpus(path, n, w, xi1, xi2, seeds, jobs=1):
+    """
+    Generates instances in parallel and writes them to a corpus file.
+    :param path: the corpus file
+    :param n: the Mersenne exponent
+    :param w: the Hamming weight of f and g
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :param seeds: the seeds of the instances
+    :param jobs: the number of worker processes (default: 1)
+    :return: the number of instances written
+    """
+    width = (n + 7) // 8
+    generate = functools.partial(generate_instance, n, w, xi1, xi2)
+    context = multiprocessing.get_context("fork")
+    offsets = []
+    with open(path, "wb") as file, context.Pool(jobs) as pool:
+        file.write(HEADER.pack(MAGIC, n, w, xi1, xi2, 0, 0))
+        for seed, f, g, h in pool.imap(generate, seeds, chunksize=16):
+            offsets.append(file.tell())
+            file.write(RECORD.pack(seed, len(f.positions), len(g.positions)))
+            file.write(struct.pack(f"<{len(f.positions) + len(g.positions)}I", *f.positions, *g.positions))
+            file.write(int(h).to_bytes(width, "little"))
+        index_offset = file.tell()
+        file.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, n, w, xi1, xi2, len(offsets), index_offset))
+    logging.info(f"Wrote {len(offsets)} instances with n={n}, w={w}, xi1={xi1}, xi2={xi2} to {path}")
+    return len(offsets)
+
+
+class Corpus:
+    """
+    A read-only corpus of instances, memory-mapped so only the instances used are read from disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.n, self.w, self.xi1, self.xi2, self.count, index_offset = HEADER.unpack_from(self.data)
+        assert magic == MAGIC, f"{path} is not an instance corpus!"
+        self.p = 2 ** self.n - 1
+        self.width = (self.n + 7) // 8
+        self.index_offset = index_offset
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        """
+        Reads an instance.
+        :param i: the index of the instance
+        :return: a tuple (seed, p, f, g, h), with f and g as their bit positions
+        """
+        if not 0 <= i < self.count:
+            raise IndexError(f"Instance {i} is not in the corpus!")
+        (offset,) = struct.unpack_from("<Q", self.data, self.index_offset + 8 * i)
+        seed, f_weight, g_weight = RECORD.unpack_from(self.data, offset)
+        offset += RECORD.size
+        positions = struct.unpack_from(f"<{f_weight + g_weight}I", self.data, offset)
+        offset += 4 * (f_weight + g_weight)
+        # Decode h from a view of the mapping, without copying its bytes out first.
+        with memoryview(self.data) as data:
+            h = Integer(int.from_bytes(data[offset:offset + self.width], "little"))
+        return seed, self.p, LowWeightInteger(positions[:f_weight]), LowWeightInteger(positions[f_weight:]), h
+
+
+@functools.lru_cache(maxsize=None)
+def open_corpus(path):
+    """
+    Opens a corpus once per process, so trials in a worker process share its mapping.
+    :param path: the corpus file
+    :return: the corpus
+    """
+    return Corpus(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates a corpus of MLHRSP instances, shared by trials with any s, strategy or reduction method.")
+    parser.add_argument("path", help="the corpus file")
+    parser.add_argument("n", type=int, help="the Mersenne exponent")
+    parser.add_argument("w", type=int, help="the Hamming weight of f and g")
+    parser.add_argument("xi1", type=float, help="the exponential parameter for f")
+    parser.add_argument("xi2", type=float, help="the exponential parameter for g")
+    parser.add_argument("--count", type=int, default=100, help="the number of instances (default: 100)")
+    parser.add_argument("--seed", type=int, default=None, help="the seed from which the instance seeds are derived (default: random)")
+    parser.add_argument("--jobs", type=int, default=1, help="the number of worker processes (default: 1)")
+    args = parser.parse_args()
+
+    rng = Random(args.seed)
+    seeds = [rng.randrange(2 ** 64) for _ in range(args.count)]
+    count = write_corpus(args.path, args.n, args.w, args.xi1, args.xi2, seeds, args.jobs)
+    print(f"Wrote {count} instances to {args.path}...")
+
+
+if __name__ == "__main__":
+    main()
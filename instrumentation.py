@@ -0,0 +1,157 @@
+import io
+import csv
+import json
+import time
+import pstats
+import logging
+import cProfile
+import resource
+import tracemalloc
+import contextlib
+
+# The stages of an attack, in the order they run.
+STAGES = ["shift_gen", "build", "reduce", "reconstruct", "root_find", "verify"]
+
+# The spans recorded since the last reset, as dicts with at least a name and a time.
+SPANS = []
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size of this process.
+    :return: the peak RSS in bytes
+    """
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """
+    Records the time spent in a named stage.
+    The yielded dict can be used to add attributes (e.g. dimension, max_bits) while the stage runs.
+    :param name: the name of the stage
+    :param attributes: the initial attributes of the span
+    :return: a context manager yielding the record of the span
+    """
+    record = {"name": name, **attributes}
+    start_time = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["time"] = time.perf_counter() - start_time
+        record["peak_rss"] = peak_rss()
+        SPANS.append(record)
+
+
+def reset():
+    """
+    Removes all recorded spans.
+    """
+    SPANS.clear()
+
+
+def spans(name=None):
+    """
+    Returns the recorded spans.
+    :param name: if set, only the spans with this name are returned (default: None)
+    :return: a list of span records
+    """
+    return [record for record in SPANS if name is None or record["name"] == name]
+
+
+def summary(records=None):
+    """
+    Aggregates spans per stage.
+    :param records: the spans to aggregate (default: the recorded spans)
+    :return: a dict mapping every stage name to its count, total time, max dimension, max entry bits and peak RSS
+    """
+    records = SPANS if records is None else records
+    stages = {}
+    for record in records:
+        stage = stages.setdefault(record["name"], {"count": 0, "time": 0.0, "dimension": None, "max_bits": None, "peak_rss": 0})
+        stage["count"] += 1
+        stage["time"] += record["time"]
+        stage["peak_rss"] = max(stage["peak_rss"], record.get("peak_rss", 0))
+        for key in ["dimension", "max_bits"]:
+            if record.get(key) is not None:
+                stage[key] = max(stage[key] or 0, record[key])
+    return dict(sorted(stages.items(), key=lambda item: STAGES.index(item[0]) if item[0] in STAGES else len(STAGES)))
+
+
+def format_summary(stages, trials=1):
+    """
+    Formats a per-stage breakdown.
+    :param stages: the aggregated stages, see summary
+    :param trials: the number of trials the stages were aggregated over (default: 1)
+    :return: the breakdown, one line per stage
+    """
+    total = sum(stage["time"] for stage in stages.values()) or 1
+    lines = []
+    for name, stage in stages.items():
+        line = f"{name:>12}: {stage['time'] / trials:.3f} seconds per trial ({stage['time'] / total * 100:.1f}%)"
+        if stage["dimension"] is not None:
+            line += f", dimension {stage['dimension']}"
+        if stage["max_bits"] is not None:
+            line += f", max entry {stage['max_bits']} bits"
+        line += f", peak RSS {stage['peak_rss'] / 2 ** 20:.1f} MiB"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def to_json(path, records=None):
+    """
+    Exports spans as a JSON list.
+    :param path: the output file
+    :param records: the spans to export (default: the recorded spans)
+    """
+    with open(path, "w") as file:
+        json.dump(SPANS if records is None else records, file, indent=1)
+
+
+def to_csv(path, records=None):
+    """
+    Exports spans as CSV, with one column per attribute.
+    :param path: the output file
+    :param records: the spans to export (default: the recorded spans)
+    """
+    records = SPANS if records is None else records
+    fields = []
+    for record in records:
+        fields.extend(key for key in record if key not in fields)
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+@contextlib.contextmanager
+def profile(prefix):
+    """
+    Profiles a block with cProfile and tracemalloc.
+    Writes the profile to <prefix>.prof and the top memory allocations to <prefix>.mem.txt.
+    :param prefix: the prefix of the output files, or None to disable profiling
+    :return: a context manager
+    """
+    if prefix is None:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        profiler.dump_stats(f"{prefix}.prof")
+        with open(f"{prefix}.mem.txt", "w") as file:
+            file.write(f"Peak traced memory: {peak} bytes\n")
+            for statistic in snapshot.statistics("lineno")[:25]:
+                file.write(f"{statistic}\n")
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(10)
+        logging.debug(f"Profile of {prefix}:\n{output.getvalue()}")
@@ -0,0 +1,91 @@
+import struct
+import hashlib
+
+from low_weight import LowWeightInteger
+
+# If set, log_value also appends the full values to this binary file, see dump.
+DUMP_PATH = None
+
+
+def _to_bytes(value):
+    value = int(value)
+    return abs(value).to_bytes((abs(value).bit_length() + 7) // 8, "little")
+
+
+class Summary:
+    """
+    Summarizes a big integer or polynomial for a log message without converting it to decimal.
+    The summary is only computed when the log record is actually emitted, so pass it as a %-style argument:
+    logging.debug("f = %s", Summary(f)).
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        value = self.value
+        if value is None:
+            return "None"
+        if isinstance(value, LowWeightInteger):
+            return f"<{value.bit_length()} bits, weight {value.hamming_weight()}, positions {list(value.positions)}>"
+        if hasattr(value, "dict"):
+            coefficients = value.dict().values()
+            bits = max((int(coefficient).bit_length() for coefficient in coefficients), default=0)
+            return f"<polynomial of degree {value.degree()} with {len(coefficients)} terms, max coefficient {bits} bits>"
+        value = int(value)
+        digest = hashlib.sha256(_to_bytes(value)).hexdigest()[:16]
+        sign = "-" if value < 0 else ""
+        return f"<{sign}{abs(value).bit_length()} bits, weight {abs(value).bit_count()}, sha256 {digest}>"
+
+    __repr__ = __str__
+
+
+def dump(label, value, path=None):
+    """
+    Appends the full value of an integer to a binary file.
+    Every record is the label length (4 bytes), the label, the sign (1 byte), the value length (8 bytes)
+    and the absolute value as little-endian bytes, all lengths little-endian.
+    :param label: the label of the value
+    :param value: the integer
+    :param path: the file (default: DUMP_PATH)
+    """
+    label = label.encode()
+    data = _to_bytes(value)
+    with open(path or DUMP_PATH, "ab") as file:
+        file.write(struct.pack("<I", len(label)) + label + struct.pack("<BQ", int(value) < 0, len(data)) + data)
+
+
+def load(path):
+    """
+    Reads all values written by dump.
+    :param path: the file
+    :return: a list of (label, value) tuples
+    """
+    values = []
+    with open(path, "rb") as file:
+        data = file.read()
+    offset = 0
+    while offset < len(data):
+        (length,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        label = data[offset:offset + length].decode()
+        offset += length
+        negative, length = struct.unpack_from("<BQ", data, offset)
+        offset += 9
+        value = int.from_bytes(data[offset:offset + length], "little")
+        offset += length
+        values.append((label, -value if negative else value))
+    return values
+
+
+def log_value(logger, level, label, value):
+    """
+    Logs a summary of a big value, and dumps the full value if DUMP_PATH is set.
+    :param logger: the logger (e.g. the logging module)
+    :param level: the logging level
+    :param label: the label of the value
+    :param value: the value
+    """
+    logger.log(level, "%s = %s", label, Summary(value))
+    if DUMP_PATH is not None and value is not None:
+        dump(label, value)
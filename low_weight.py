@@ -0,0 +1,86 @@
+from random import sample
+
+import mersenne
+
+
+class LowWeightInteger:
+    """
+    A non-negative integer with few bits set, stored as the sorted tuple of the positions of its set bits.
+    The integer itself is only built when it is needed (int() or a comparison with a dense integer).
+    """
+
+    def __init__(self, positions):
+        self.positions = tuple(sorted(positions))
+        assert len(set(self.positions)) == len(self.positions), "Bit positions must be distinct!"
+        self._value = None
+
+    @classmethod
+    def random(cls, bits, weight):
+        """
+        Samples a random integer with a given number of bits and given Hamming weight, without rejection.
+        :param bits: the number of bits, the top bit is always set
+        :param weight: the Hamming weight
+        :return: the sampled integer
+        """
+        return cls([bits - 1, *sample(range(bits - 1), weight - 1)])
+
+    @classmethod
+    def from_int(cls, a):
+        """
+        Converts a dense integer to its bit positions.
+        :param a: the non-negative integer
+        :return: the converted integer
+        """
+        a = int(a)
+        positions = []
+        while a:
+            low = a & -a
+            positions.append(low.bit_length() - 1)
+            a ^= low
+        return cls(positions)
+
+    def hamming_weight(self):
+        """
+        :return: the number of set bits
+        """
+        return len(self.positions)
+
+    def bit_length(self):
+        """
+        :return: the number of bits
+        """
+        return self.positions[-1] + 1 if self.positions else 0
+
+    def mul_mod(self, a, n):
+        """
+        Multiplies an integer by this integer modulo p = 2^n - 1, as a sum of rotations of a.
+        :param a: the integer
+        :param n: the Mersenne exponent
+        :return: a * self mod p
+        """
+        a = mersenne.reduce(a, n)
+        return mersenne.reduce(sum(mersenne.rotate(a, position, n) for position in self.positions), n)
+
+    def __int__(self):
+        if self._value is None:
+            value = 0
+            for position in self.positions:
+                value |= 1 << position
+            self._value = value
+        return self._value
+
+    __index__ = __int__
+
+    def __eq__(self, other):
+        if isinstance(other, LowWeightInteger):
+            return self.positions == other.positions
+        try:
+            return int(self) == int(other)
+        except (TypeError, ValueError):
+            return NotImplemented
+
+    def __hash__(self):
+        return hash(int(self))
+
+    def __repr__(self):
+        return f"LowWeightInteger({list(self.positions)})"
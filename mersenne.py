@@ -0,0 +1,105 @@
+from sage.rings.integer import Integer
+
+
+def mersenne_exponent(N):
+    """
+    Detects a Mersenne modulus.
+    :param N: the modulus
+    :return: n if N = 2^n - 1, else None
+    """
+    N = int(N)
+    if N > 0 and N & (N + 1) == 0:
+        return N.bit_length()
+    return None
+
+
+def reduce(a, n):
+    """
+    Reduces an integer modulo p = 2^n - 1 using shifts and additions, since 2^n = 1 (mod p).
+    :param a: the integer
+    :param n: the Mersenne exponent
+    :return: a mod p, in [0, p)
+    """
+    a = int(a)
+    p = (1 << n) - 1
+    negative = a < 0
+    if negative:
+        a = -a
+    while a > p:
+        a = (a & p) + (a >> n)
+    if a == p:
+        a = 0
+    return p - a if negative and a != 0 else a
+
+
+def rotate(a, k, n):
+    """
+    Multiplies an integer by 2^k modulo p = 2^n - 1, which is a rotation of its n bits.
+    :param a: the integer, in [0, p)
+    :param k: the exponent of 2
+    :param n: the Mersenne exponent
+    :return: a * 2^k mod p
+    """
+    k %= n
+    if k == 0:
+        return a
+    p = (1 << n) - 1
+    return ((a << k) & p) | (a >> (n - k))
+
+
+def mul_mod(a, b, n):
+    """
+    Multiplies two integers modulo p = 2^n - 1.
+    :param a: the first integer
+    :param b: the second integer
+    :param n: the Mersenne exponent
+    :return: a * b mod p
+    """
+    return reduce(a * b, n)
+
+
+def inverse(a, n):
+    """
+    Inverts an integer modulo p = 2^n - 1.
+    The power of two dividing a is inverted by a rotation, because 2^-e = 2^(n - e) (mod p),
+    so only the odd part is inverted with the extended Euclidean algorithm.
+    :param a: the integer, coprime to p
+    :param n: the Mersenne exponent
+    :return: a^-1 mod p
+    """
+    a = reduce(a, n)
+    zeros = (a & -a).bit_length() - 1
+    return rotate(int(Integer(a >> zeros).inverse_mod((1 << n) - 1)), n - zeros, n)
+
+
+def mod(a, N):
+    """
+    Reduces an integer modulo N, using shifts and additions if N is a Mersenne number.
+    :param a: the integer
+    :param N: the modulus
+    :return: a mod N
+    """
+    n = mersenne_exponent(N)
+    return a % N if n is None else reduce(a, n)
+
+
+def inverse_mod(a, N):
+    """
+    Inverts an integer modulo N, using the structure of N if it is a Mersenne number.
+    :param a: the integer, coprime to N
+    :param N: the modulus
+    :return: a^-1 mod N
+    """
+    n = mersenne_exponent(N)
+    return int(Integer(a).inverse_mod(N)) if n is None else inverse(a, n)
+
+
+def is_root(f, roots, N):
+    """
+    Checks that given values are a root of a polynomial modulo N.
+    :param f: the polynomial
+    :param roots: the values of the unknowns
+    :param N: the modulus
+    :return: True if f(*roots) = 0 (mod N)
+    """
+    return mod(int(f(*roots)), N) == 0
@@ -0,0 +1,186 @@
+import math
+import time
+import queue
+import logging
+import collections
+import multiprocessing
+
+from sage.rings.integer import Integer
+
+import lazylog
+import mersenne
+import instrumentation
+from low_weight import LowWeightInteger
+
+STRATEGIES = ["basic", "improved", "rational"]
+
+# The outcome of solve: the found f and g (None if not found), whether they are correct, and the time in seconds.
+Result = collections.namedtuple("Result", ["f", "g", "success", "time"])
+
+
+def hamming_weight(a):
+    """
+    Calculate the Hamming weight of an integer.
+    :param a: the integer
+    :return: the number of non-zero bits in the binary representation of the integer
+    """
+    if isinstance(a, LowWeightInteger):
+        return a.hamming_weight()
+    return int(a).bit_count()
+
+
+def get_number(n, h):
+    """
+    Generate a random integer with a given number of bits and given Hamming weight.
+    :param n: the number of bits
+    :param h: the Hamming weight
+    :return: the generated random integer, as its bit positions
+    """
+    return LowWeightInteger.random(n, h)
+
+
+def generate_MLHRSP_instance(n, w, xi1, xi2, af=1):
+    """
+    Generate a random MLHRSP instances of f, g, and h for a given set of parameters.
+    :param n: the number of bits for the integers
+    :param w: the Hamming weight for f and g
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :param af: the achievement factor (default: 1)
+    :return: a tuple (f, g, h) containing the generated instance, with f and g as their bit positions
+    """
+    bf = int(n * xi1)
+    bg = int(n * xi2 * af)
+    logging.info(f"Generating MLHRSP instance with {n}-bit modulus p, {bf}-bit f, {bg}-bit g and Hamming weight {w}...")
+    p = 2 ** n - 1
+    f = get_number(bf, w)
+    g = get_number(bg, w)
+    while math.gcd(int(f), int(g)) != 1:
+        g = get_number(bg, w)
+    h = Integer(f.mul_mod(mersenne.inverse(int(g), n), n))
+    return p, f, g, h
+
+
+def solve(p, h, xi1, xi2, s=5, strategy="basic", expected=None, verifier=None, reduction_method=None, reduction_options=None, s_start=None):
+    """
+    Recovers the small f and g with h = f / g (mod p).
+    The solving strategies (and with them the rest of Sage) are imported on the first call,
+    so a long-running process pays for the import once and importing this module stays cheap.
+    :param p: the Mersenne prime
+    :param h: the given known parameter
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :param s: the parameter for controlling lattice construction, or "auto" to increase s until the attack succeeds (default: 5)
+    :param strategy: the strategy to use, can be "basic", "improved", or "rational" (default: "basic")
+    :param expected: the expected roots (f, g); if set, the attack only succeeds if it found them (default: None)
+    :param verifier: a function of the found f and g returning True if they are correct (default: None);
+                     without a verifier or expected roots, any roots found are accepted, since the strategies check f = h * g (mod p)
+    :param reduction_method: the lattice reduction method, see small_roots.reduce_lattice (default: None)
+    :param reduction_options: a dict of options for the lattice reduction method (default: None)
+    :param s_start: the first s to try if s is "auto" (default: the theoretical minimum)
+    :return: a Result
+    """
+    import solving_strategy
+
+    assert strategy in STRATEGIES, f"Solving strategy is not defined! Please input a correct strategy name."
+    start_time = time.perf_counter()
+    if s == "auto":
+        logging.info(f"Using {strategy} solving strategy with adaptive s to find roots...")
+        fs, gs = solving_strategy.adaptive_attack(p, h, xi1, xi2, strategy, s_start, reduction_method=reduction_method, reduction_options=reduction_options)
+    else:
+        logging.info(f"Using {strategy} solving strategy to find roots...")
+        attack = getattr(solving_strategy, f"{strategy}_attack")
+        fs, gs = attack(p, h, xi1, xi2, s, reduction_method, reduction_options)
+    end_time = time.perf_counter()
+
+    if fs is None or gs is None:
+        success = False
+    elif verifier is not None:
+        success = bool(verifier(fs, gs))
+    elif expected is not None:
+        success = expected[0] == fs and expected[1] == gs
+    else:
+        success = True
+
+    if success:
+        logging.info(f"Succeeded!")
+        lazylog.log_value(logging, logging.INFO, "Found f", fs)
+        lazylog.log_value(logging, logging.INFO, "Found g", gs)
+    else:
+        logging.info(f"Failed!")
+    return Result(fs, gs, success, end_time - start_time)
+
+
+def read_h_values(file, width=None):
+    """
+    Reads h values one at a time from a file, so an input of any size is never loaded at once.
+    :param file: the file, opened in binary mode
+    :param width: if set, the values are stored as consecutive little-endian integers of this many bytes,
+                  else one integer per line, in decimal or with a 0x prefix (default: None)
+    :return: a generator generating the h values
+    """
+    if width is not None:
+        while True:
+            data = file.read(width)
+            if len(data) < width:
+                return
+            yield Integer(int.from_bytes(data, "little"))
+    else:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield Integer(int(line, 0))
+
+
+def _solve_indexed(index, h, p, xi1, xi2, s, strategy, options):
+    # The spans of earlier h values are never read, so they are dropped to keep the memory of a long batch bounded.
+    instrumentation.reset()
+    return index, h, solve(p, h, xi1, xi2, s, strategy, **options)
+
+
+def solve_batch(p, hs, xi1, xi2, s=5, strategy="basic", jobs=1, max_pending=None, initializer=None, initargs=(), **options):
+    """
+    Solves many h values for the same p and parameters, yielding the results as they finish.
+    Everything which does not depend on h is computed once before the workers are forked, see solving_strategy.precompute.
+    The h values are only read while fewer than max_pending of them are being solved, so memory stays bounded.
+    :param p: the Mersenne prime
+    :param hs: an iterable of h values, e.g. read_h_values
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :param s: the parameter for controlling lattice construction, or "auto" (default: 5)
+    :param strategy: the strategy to use, can be "basic", "improved", or "rational" (default: "basic")
+    :param jobs: the number of worker processes (default: 1)
+    :param max_pending: the maximum number of h values submitted but not yet yielded (default: 2 * jobs)
+    :param initializer: a function run in every worker process, e.g. to allocate its PARI stack (default: None)
+    :param initargs: the arguments of the initializer (default: ())
+    :param options: further keyword arguments of solve, e.g. verifier or reduction_method, which must be picklable if jobs > 1
+    :return: a generator generating (index, h, Result) tuples, in completion order if jobs > 1
+    """
+    import solving_strategy
+
+    solving_strategy.precompute(p, xi1, xi2, s, strategy)
+    if jobs == 1:
+        for index, h in enumerate(hs):
+            yield _solve_indexed(index, h, p, xi1, xi2, s, strategy, options)
+        return
+
+    max_pending = max_pending or 2 * jobs
+    results = queue.Queue()
+    pending = 0
+    context = multiprocessing.get_context("fork")
+    with context.Pool(jobs, initializer=initializer, initargs=initargs) as pool:
+        for index, h in enumerate(hs):
+            while pending >= max_pending:
+                outcome = results.get()
+                pending -= 1
+                if isinstance(outcome, BaseException):
+                    raise outcome
+                yield outcome
+            pool.apply_async(_solve_indexed, (index, h, p, xi1, xi2, s, strategy, options), callback=results.put, error_callback=results.put)
+            pending += 1
+        while pending > 0:
+            outcome = results.get()
+            pending -= 1
+            if isinstance(outcome, BaseException):
+                raise outcome
+            yield outcome
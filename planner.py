@@ -0,0 +1,104 @@
+import math
+
+# The resident memory of a process after importing Sage, before any lattice is built.
+BASE_MEMORY = 400 * 2 ** 20
+
+# The number of copies of the lattice each reduction method keeps alive (Sage matrix, backend copy, result, GSO data).
+MEMORY_FACTORS = {"lll": 4, "bkz": 5, "partial": 4, "flatter": 6}
+
+# The bytes of bookkeeping GMP and Python keep per integer entry.
+ENTRY_OVERHEAD = 32
+
+# Lattices below this dimension are reduced with LLL, since starting flatter costs more than it saves.
+FLATTER_MIN_DIMENSION = 8
+
+# The bounds of the PARI stack. It only holds the root finding, so it is sized from the reconstructed polynomials.
+MIN_STACK_SIZE = 2 ** 26
+MAX_STACK_SIZE = 10000000000
+
+
+def parse_size(value):
+    """
+    Parses a memory size with an optional K, M, G or T suffix (powers of 1024).
+    :param value: the size, e.g. "512M"
+    :return: the size in bytes
+    """
+    value = value.strip().upper().removesuffix("B").removesuffix("I")
+    for exponent, suffix in enumerate("KMGT", 1):
+        if value.endswith(suffix):
+            return int(float(value[:-1]) * 1024 ** exponent)
+    return int(value)
+
+
+def lattice_size(n, xi1, xi2, s, strategy):
+    """
+    Predicts the dimension and the largest entry bit length of the lattice of a strategy, with m = t = s.
+    After normalizing f to x + c * y with c < N, the largest entry is N^t * c^k * Y^(m - k) times a binomial coefficient,
+    so it has at most s * (n + n * xi2 + 1) bits.
+    :param n: the Mersenne exponent
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :param s: the s value
+    :param strategy: the strategy, can be "basic", "improved", or "rational"
+    :return: a tuple (dimension, max_bits)
+    """
+    if strategy == "rational":
+        return 2, n
+    dimension = (s + 1) * (s + 2) // 2 if strategy == "basic" else s + 1
+    return dimension, s * (n + math.ceil(n * xi2) + 1)
+
+
+def estimate_memory(dimension, max_bits, reduction_method):
+    """
+    Predicts the peak memory of an attack on a lattice.
+    :param dimension: the dimension of the lattice
+    :param max_bits: the largest entry bit length
+    :param reduction_method: the lattice reduction method
+    :return: the predicted peak memory in bytes
+    """
+    factor = MEMORY_FACTORS.get(reduction_method, max(MEMORY_FACTORS.values()))
+    return BASE_MEMORY + factor * dimension ** 2 * (max_bits // 8 + ENTRY_OVERHEAD)
+
+
+def stack_size(dimension, max_bits):
+    """
+    Sizes the PARI stack for the root finding on the reconstructed polynomials of a lattice.
+    :param dimension: the dimension of the lattice
+    :param max_bits: the largest entry bit length
+    :return: the stack size in bytes
+    """
+    return min(max(MIN_STACK_SIZE, 16 * dimension * (max_bits // 8)), MAX_STACK_SIZE)
+
+
+def plan(n, xi1, xi2, s, strategy, reduction_method=None, budget=None, down_scale=False):
+    """
+    Plans the memory of an attack: the lattice size, the reduction method, the PARI stack and the predicted peak.
+    Without an explicit reduction method, small lattices use LLL, and LLL is preferred to flatter if only it fits the budget.
+    :param n: the Mersenne exponent
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :param s: the s value
+    :param strategy: the strategy, can be "basic", "improved", or "rational"
+    :param reduction_method: the lattice reduction method, or None to choose one (default: None)
+    :param budget: the memory budget of a trial in bytes (default: None)
+    :param down_scale: set to true to lower s until the attack fits the budget instead of refusing it (default: False)
+    :return: a dict with the s, dimension, max_bits, reduction_method, stack_size and memory of the attack
+    :raises MemoryError: if the attack does not fit the budget
+    :raises ValueError: if s is below 1
+    """
+    if s < 1:
+        raise ValueError(f"s must be at least 1, not {s}!")
+    for s_plan in range(s, 0, -1):
+        dimension, max_bits = lattice_size(n, xi1, xi2, s_plan, strategy)
+        method = reduction_method
+        if method is None:
+            method = "lll" if dimension < FLATTER_MIN_DIMENSION else "flatter"
+            if budget is not None and estimate_memory(dimension, max_bits, method) > budget:
+                method = "lll"
+        memory = estimate_memory(dimension, max_bits, method)
+        if budget is None or memory <= budget:
+            stack = stack_size(dimension, max_bits) if budget is None else min(stack_size(dimension, max_bits), budget)
+            return {"s": s_plan, "dimension": dimension, "max_bits": max_bits, "reduction_method": method, "stack_size": stack, "memory": memory}
+        if not down_scale:
+            break
+    raise MemoryError(f"An attack with n={n}, xi1={xi1}, xi2={xi2}, s={s} and {strategy} strategy needs about {memory / 2 ** 20:.1f} MiB, more than the budget of {budget / 2 ** 20:.1f} MiB.")
@@ -1,11 +1,20 @@
+import inspect
+import functools
+import itertools
 import logging
 import time
 
 from sage.all import *
 
+import lazylog
+import mersenne
+import instrumentation
+
 DEBUG_ROOTS = None
 Bound_Check = False
 USE_FLATTER = True
+# Set to divide out a power of two dividing the whole lattice before reduction, see reduce_lattice.
+REMOVE_POWER_OF_TWO_CONTENT = True
 
 
 def create_lattice(pr, shifts, bounds, order="invlex", sort_shifts_reverse=False, sort_monomials_reverse=False):
@@ -30,94 +39,230 @@ def create_lattice(pr, shifts, bounds, order="invlex", sort_shifts_reverse=False
 
     shifts.sort(reverse=sort_shifts_reverse)
     monomials = sorted(monomials, reverse=sort_monomials_reverse)
-    L = matrix(ZZ, len(shifts), len(monomials))
+
+    # Map the exponents of every monomial to its column and scale each column only once.
+    columns = {exponents: col for col, monomial in enumerate(monomials) for exponents in monomial.dict()}
+    scalings = [monomial(*bounds) for monomial in monomials]
+    ncols = len(monomials)
+    entries = [0] * (len(shifts) * ncols)
     for row, shift in enumerate(shifts):
-        for col, monomial in enumerate(monomials):
-            L[row, col] = shift.monomial_coefficient(monomial) * monomial(*bounds)
+        for exponents, coefficient in shift.dict().items():
+            col = columns[exponents]
+            entries[row * ncols + col] = coefficient * scalings[col]
 
+    L = matrix(ZZ, len(shifts), ncols, entries)
     monomials = [pr(monomial) for monomial in monomials]
     return L, monomials
 
 
-def reduce_lattice(L, delta=0.8):
+def _encode_lattice(L):
     """
-    Reduces a lattice basis using a lattice reduction algorithm (currently LLL).
+    Encodes a lattice basis in the fplll text format read by flatter.
+    :param L: the lattice basis
+    :return: the encoded basis
+    """
+    # The entries are Sage integers, which GMP converts to decimal in subquadratic time.
+    return ("[[" + "]\n[".join(" ".join(map(str, row)) for row in L.rows()) + "]]").encode()
+
+
+def _decode_lattice(output, nrows, ncols):
+    """
+    Decodes a lattice basis in the fplll text format written by flatter.
+    :param output: the output of flatter
+    :param nrows: the number of rows
+    :param ncols: the number of columns
+    :return: the decoded basis
+    """
+    tokens = output.decode().replace("[", " ").replace("]", " ").split()
+    return matrix(ZZ, nrows, ncols, [ZZ(token) for token in tokens])
+
+
+# Lattice reduction methods by name, see reduction_method.
+REDUCTION_METHODS = {}
+
+# The options every lattice reduction method accepts, by name.
+REDUCTION_OPTIONS = {}
+
+# The fplll LLL variants, from the fastest to the most reliable.
+LLL_VARIANTS = {
+    "fast": "fpLLL:fast",
+    "heuristic": "fpLLL:heuristic",
+    "proved": "fpLLL:proved",
+    "wrapper": "fpLLL:wrapper",
+}
+
+# The floating point types accepted by the fp option of Sage's LLL and BKZ.
+FP_TYPES = ["fp", "ld", "qd", "xd", "rr"]
+
+
+def reduction_method(name):
+    """
+    Registers a lattice reduction method.
+    The method is called as method(L, delta, bound, **options), where bound is the norm the first rows should be below
+    (or None if unknown), and returns a tuple of the reduced basis and the time spent transporting the basis.
+    :param name: the name of the method
+    :return: a decorator registering the method
+    """
+    def register(method):
+        REDUCTION_METHODS[name] = method
+        REDUCTION_OPTIONS[name] = set(inspect.signature(method).parameters) - {"L", "delta", "bound"}
+        return method
+
+    return register
+
+
+@reduction_method("flatter")
+def _reduce_flatter(L, delta, bound):
+    from subprocess import check_output
+    start_time = time.perf_counter()
+    LL = _encode_lattice(L)
+    encoded_time = time.perf_counter()
+    ret = check_output(["flatter"], input=LL)
+    decode_time = time.perf_counter()
+    L_reduced = _decode_lattice(ret, L.nrows(), L.ncols())
+    return L_reduced, (encoded_time - start_time) + (time.perf_counter() - decode_time)
+
+
+@reduction_method("lll")
+def _reduce_lll(L, delta, bound, variant=None, fp=None, prec=0):
+    if variant is None and fp is None and not prec:
+        return L.LLL(delta), 0
+    return L.LLL(delta, algorithm=LLL_VARIANTS[variant or "fast"], fp=fp, prec=prec), 0
+
+
+@reduction_method("bkz")
+def _reduce_bkz(L, delta, bound, block_size=10, fp=None, prec=0):
+    return L.BKZ(delta=delta, block_size=block_size, fp=fp, prec=prec), 0
+
+
+@reduction_method("partial")
+def _reduce_partial(L, delta, bound, rows=1, deltas=(0.5, 0.75), variant="fast", fp=None, prec=0):
+    # Reduce with increasing delta, stopping as soon as the first rows are below the bound.
+    for stage_delta in (*deltas, delta):
+        L = L.LLL(stage_delta, algorithm=LLL_VARIANTS[variant], fp=fp, prec=prec)
+        if bound is not None and all(L[row] * L[row] * L.nrows() < bound ** 2 for row in range(min(rows, L.nrows()))):
+            logging.debug(f"First {rows} rows are short enough after LLL with delta = {stage_delta}...")
+            break
+    return L, 0
+
+
+def _valuation2(a):
+    """
+    :return: the exponent of the largest power of two dividing the nonzero integer a
+    """
+    a = int(a)
+    return (a & -a).bit_length() - 1
+
+
+def reduce_lattice(L, delta=0.8, method=None, bound=None, **options):
+    """
+    Reduces a lattice basis using a lattice reduction algorithm.
     :param L: the lattice basis
     :param delta: the delta parameter for LLL (default: 0.8)
+    :param method: the reduction method, can be "flatter", "lll", "bkz", or "partial" (default: "flatter" if USE_FLATTER else "lll")
+    :param bound: the modulus the first rows should be short relative to, used by the "partial" method (default: None)
+    :param options: the options of the reduction method (variant, fp, prec, block_size, rows, deltas);
+                    options the method does not accept are ignored, see REDUCTION_OPTIONS
     :return: the reduced basis
     """
+    if method is None:
+        method = "flatter" if USE_FLATTER else "lll"
+    assert method in REDUCTION_METHODS, f"Reduction method {method} is not defined!"
+    ignored = set(options) - REDUCTION_OPTIONS[method]
+    if ignored:
+        logging.debug(f"Ignoring the options {sorted(ignored)} which the {method} reduction method does not accept...")
+        options = {name: value for name, value in options.items() if name not in ignored}
     # logging.debug(f"Reducing a {L.nrows()} x {L.ncols()} lattice...")
     # logging.info(f"Reducing a {L.nrows()} x {L.ncols()} lattice...")
-    start_time = time.perf_counter()
-    if USE_FLATTER:
-        from subprocess import check_output
-        from re import findall
-        LL = "[[" + "]\n[".join(" ".join(map(str, row)) for row in L) + "]]"
-        ret = check_output(["flatter"], input = LL.encode())
-        L_reduced = matrix(L.nrows(), L.ncols(), map(int, findall(rb"-?\d+", ret)))
-    else:
-        L_reduced = L.LLL(delta)
-    end_time = time.perf_counter()
-    reduced_time = end_time - start_time
-    logging.info(f"Reducing a {L.nrows()} x {L.ncols()} lattice within {reduced_time:.3f} seconds...")
+    # Reduction commutes with scaling, so a power of two dividing every entry is divided out and restored afterwards.
+    content = 0
+    if REMOVE_POWER_OF_TWO_CONTENT:
+        content = min((_valuation2(entry) for entry in L.list() if entry != 0), default=0)
+    if content > 0:
+        logging.debug(f"Dividing the lattice by its power of two content 2^{content}...")
+        L = L.apply_map(lambda entry: entry >> content, ZZ)
+        bound = None if bound is None else bound >> content
+
+    with instrumentation.span("reduce", method=method, dimension=L.nrows(), max_bits=int(L.height().nbits()), content_bits=content) as record:
+        start_time = time.perf_counter()
+        L_reduced, transport_time = REDUCTION_METHODS[method](L, delta, bound, **options)
+        end_time = time.perf_counter()
+        record["transport_time"] = transport_time
+    if content > 0:
+        L_reduced = L_reduced * 2 ** content
+    reduced_time = end_time - start_time - transport_time
+    logging.info(f"Reducing a {L.nrows()} x {L.ncols()} lattice using {method} within {reduced_time:.3f} seconds (transport {transport_time:.3f} seconds)...")
     return L_reduced
 
 
-def reconstruct_polynomials(B, f, modulus, monomials, bounds, preprocess_polynomial=lambda x: x, divide_gcd=True):
+def iter_polynomials(B, f, modulus, monomials, bounds, preprocess_polynomial=lambda x: x, divide_gcd=True, rows=None):
     """
-    Reconstructs polynomials from the lattice basis in the monomials.
+    Reconstructs polynomials from the lattice basis in the monomials, one row at a time.
+    The column scalings are computed once and every polynomial is built in one shot from its nonzero coefficients.
     :param B: the lattice basis
     :param f: the original polynomial (if set to None, polynomials will not be divided by f if possible)
     :param modulus: the original modulus
     :param monomials: the monomials
     :param bounds: the bounds
-    :param preprocess_polynomial: a function which preprocesses a polynomial before it is added to the list (default: identity function)
-    :param divide_gcd: if set to True, polynomials will be pairwise divided by their gcd if possible (default: True)
-    :return: a list of polynomials
+    :param preprocess_polynomial: a function which preprocesses a polynomial before it is yielded (default: identity function)
+    :param divide_gcd: if set to True, polynomials will be divided by their content (default: True)
+    :param rows: if set, only the first rows rows of the basis are used (default: None)
+    :return: a generator generating the polynomials
     """
-    logging.debug(f"Reconstructing polynomials (divide_original = {f is not None}, modulus_bound = {modulus is not None}, divide_gcd = {divide_gcd})...")
-    polynomials = []
-    for row in range(B.nrows()):
-        norm_squared = 0
-        w = 0
-        polynomial = 0
-        for col, monomial in enumerate(monomials):
-            if B[row, col] == 0:
-                continue
-            norm_squared += B[row, col] ** 2
-            w += 1
-            assert B[row, col] % monomial(*bounds) == 0
-            polynomial += B[row, col] * monomial // monomial(*bounds)
+    logging.debug(f"Reconstructing polynomials (divide_original = {f is not None}, modulus_bound = {modulus is not None}, divide_gcd = {divide_gcd}, rows = {rows})...")
+    pr = monomials[0].parent()
+    keys = [next(iter(monomial.dict())) for monomial in monomials]
+    scalings = [monomial(*bounds) for monomial in monomials]
+    nrows = B.nrows() if rows is None else min(rows, B.nrows())
+    for row in range(nrows):
+        entries = B.row(row).dict()
+        coefficients = {}
+        for col, entry in entries.items():
+            coefficient, remainder = divmod(entry, scalings[col])
+            assert remainder == 0
+            coefficients[keys[col]] = coefficient
 
         # Equivalent to norm >= modulus / sqrt(w)
-        if Bound_Check and modulus is not None and norm_squared * w >= modulus ** 2:
+        if Bound_Check and modulus is not None and sum(entry ** 2 for entry in entries.values()) * len(entries) >= modulus ** 2:
             logging.debug(f"Row {row} is too large, ignoring...")
             continue
 
-        polynomial = preprocess_polynomial(polynomial)
+        polynomial = preprocess_polynomial(pr(coefficients))
 
         if f is not None and polynomial % f == 0:
             logging.debug(f"Original polynomial divides reconstructed polynomial at row {row}, dividing...")
             polynomial //= f
 
-        if divide_gcd:
-            for i in range(len(polynomials)):
-                g = gcd(polynomial, polynomials[i])
-                # TODO: why are we only allowed to divide out g if it is constant?
-                if g != 1 and g.is_constant():
-                    logging.debug(f"Reconstructed polynomial has gcd @#$ with polynomial at {i}, dividing...")
-                    polynomial //= g
-                    polynomials[i] //= g
+        if divide_gcd and not polynomial.is_zero():
+            # Dividing by the content keeps the integer roots, like dividing out constant common factors of pairs did.
+            content = gcd(polynomial.coefficients())
+            if content != 1:
+                polynomial //= content
 
         if polynomial.is_constant():
             logging.debug(f"Polynomial at row {row} is constant, ignoring...")
             continue
 
         if DEBUG_ROOTS is not None:
-            logging.debug(f"Polynomial at row {row} roots check: {polynomial(*DEBUG_ROOTS)}")
+            logging.debug("Polynomial at row %d roots check: %s", row, lazylog.Summary(polynomial(*DEBUG_ROOTS)))
+
+        yield polynomial
 
-        polynomials.append(polynomial)
 
+def reconstruct_polynomials(B, f, modulus, monomials, bounds, preprocess_polynomial=lambda x: x, divide_gcd=True, rows=None):
+    """
+    Reconstructs polynomials from the lattice basis in the monomials.
+    :param B: the lattice basis
+    :param f: the original polynomial (if set to None, polynomials will not be divided by f if possible)
+    :param modulus: the original modulus
+    :param monomials: the monomials
+    :param bounds: the bounds
+    :param preprocess_polynomial: a function which preprocesses a polynomial before it is added to the list (default: identity function)
+    :param divide_gcd: if set to True, polynomials will be divided by their content (default: True)
+    :param rows: if set, only the first rows rows of the basis are used (default: None)
+    :return: a list of polynomials
+    """
+    polynomials = list(iter_polynomials(B, f, modulus, monomials, bounds, preprocess_polynomial, divide_gcd, rows))
     logging.debug(f"Reconstructed {len(polynomials)} polynomials")
     return polynomials
 
@@ -137,6 +282,26 @@ def find_roots_univariate(x, polynomial):
             yield {x: int(root)}
 
 
+def find_roots_homogeneous(polynomial):
+    """
+    Returns a generator generating the rational roots of a bivariate homogeneous polynomial.
+    The polynomial is dehomogenized by x = t * y into a univariate polynomial in t, whose rational roots are found exactly.
+    :param polynomial: the homogeneous polynomial in x and y
+    :return: a generator generating tuples of (x, y) roots with y > 0
+    """
+    coefficients = {}
+    for exponents, coefficient in polynomial.dict().items():
+        coefficients[exponents[0]] = coefficients.get(exponents[0], 0) + coefficient
+
+    g = ZZ["t"](coefficients)
+    if g.is_constant():
+        return
+
+    for root in g.roots(QQ, multiplicities=False):
+        if root != 0:
+            yield root.numerator(), root.denominator()
+
+
 def find_roots_gcd(pr, polynomials):
     """
     Returns a generator generating all roots of a polynomial in some unknowns.
@@ -244,24 +409,165 @@ def find_roots_variety(pr, polynomials):
             return
 
 
-def find_roots(pr, polynomials, method="groebner"):
+# The primes of the multimodular resultant computation start after this value, below the 2^31 limit of Singular prime fields.
+RESULTANT_PRIME = 2 ** 30
+
+
+# The primes after RESULTANT_PRIME found so far, shared by all resultants of a process.
+_resultant_primes = []
+
+
+def _resultant_prime(index):
+    """
+    :return: the index-th prime after RESULTANT_PRIME
+    """
+    while len(_resultant_primes) <= index:
+        _resultant_primes.append(int(next_prime(_resultant_primes[-1] if _resultant_primes else RESULTANT_PRIME)))
+    return _resultant_primes[index]
+
+
+@functools.lru_cache(maxsize=256)
+def _resultant_ring(pr, q):
+    """
+    :return: the polynomial ring pr over GF(q), built once per ring and prime instead of once per resultant
+    """
+    return pr.change_ring(GF(q))
+
+
+def _resultant_multimodular(p1, p2):
+    """
+    Computes the resultant of two bivariate integer polynomials with respect to the first variable, modulo many primes.
+    The residues are combined with the CRT until the balanced result stops changing (early termination)
+    or the modulus exceeds twice the bound ||p1||_1^deg(p2) * ||p2||_1^deg(p1) on its coefficients (exact).
+    :param p1: the first polynomial
+    :param p2: the second polynomial
+    :return: a tuple of the resultant as a dict of (degree in the second variable: coefficient) entries and True if it is proven exact
+    """
+    pr = p1.parent()
+    d1 = p1.degree(pr.gen(0))
+    d2 = p2.degree(pr.gen(0))
+    bound = sum(abs(c) for c in p1.coefficients()) ** d2 * sum(abs(c) for c in p2.coefficients()) ** d1
+
+    modulus = 1
+    coefficients = {}
+    index = 0
+    while modulus <= 2 * bound:
+        q = _resultant_prime(index)
+        index += 1
+        prq = _resultant_ring(pr, q)
+        p1q, p2q = prq(p1), prq(p2)
+        # Skip unlucky primes where a leading coefficient vanishes.
+        if p1q.degree(prq.gen(0)) != d1 or p2q.degree(prq.gen(0)) != d2:
+            continue
+
+        residues = {exponents[1]: int(c) for exponents, c in p1q.resultant(p2q, prq.gen(0)).dict().items()}
+        inverse = pow(modulus, -1, q)
+        combined = {}
+        for degree in coefficients.keys() | residues.keys():
+            a = coefficients.get(degree, 0)
+            c = (a + modulus * ((residues.get(degree, 0) - a) * inverse % q)) % (modulus * q)
+            if c != 0:
+                combined[degree] = c - modulus * q if c > modulus * q // 2 else c
+        modulus *= q
+        if combined == coefficients and modulus > 2 ** 64:
+            return combined, False
+        coefficients = combined
+    return coefficients, True
+
+
+def _specialize(polynomial, y0):
+    """
+    Substitutes a value for the second variable of a bivariate polynomial.
+    :param polynomial: the polynomial
+    :param y0: the value
+    :return: the univariate polynomial in the first variable, over ZZ
+    """
+    coefficients = {}
+    for exponents, coefficient in polynomial.dict().items():
+        coefficients[exponents[0]] = coefficients.get(exponents[0], 0) + coefficient * y0 ** exponents[1]
+    return ZZ["t"](coefficients)
+
+
+def find_roots_incremental(pr, polynomials, verify=None, report=None):
+    """
+    Returns a generator generating the roots of bivariate polynomials, using the polynomials incrementally from the shortest row.
+    Every new polynomial is paired with the previous ones and the first variable is eliminated with a multimodular resultant.
+    A zero resultant means a common factor, whose linear homogeneous part gives the roots directly.
+    :param pr: the polynomial ring
+    :param polynomials: the reconstructed polynomials
+    :param verify: a function checking a dict of roots, the generator stops at the first root passing it (default: None)
+    :param report: a dict which gets the path ("incremental" or "gcd") and the number of rows used for a root (default: None)
+    :return: a generator generating dicts of (x: xroot, y: yroot) entries
+    """
+    if pr.ngens() != 2:
+        return
+
+    report = {} if report is None else report
+    x, y = pr.gens()
+    for i in range(1, len(polynomials)):
+        for j in range(i):
+            resultant, exact = _resultant_multimodular(polynomials[i], polynomials[j])
+            logging.debug(f"Resultant of polynomials {j} and {i} has degree {max(resultant, default=0)} (exact = {exact})")
+            candidates = []
+            if len(resultant) == 0:
+                path = "gcd"
+                g = gcd(polynomials[i], polynomials[j])
+                if g.degree() == 1 and g.nvariables() == 2 and g.constant_coefficient() == 0:
+                    a = int(g.monomial_coefficient(x))
+                    b = int(g.monomial_coefficient(y))
+                    candidates = [{x: b, y: a}, {x: -b, y: a}]
+            else:
+                path = "incremental"
+                for y0 in ZZ["t"](resultant).roots(ZZ, multiplicities=False):
+                    if y0 == 0:
+                        continue
+                    u = gcd(_specialize(polynomials[i], y0), _specialize(polynomials[j], y0))
+                    for x0 in u.roots(ZZ, multiplicities=False) if not u.is_constant() else []:
+                        candidates.append({x: int(x0), y: int(y0)})
+
+            for roots in candidates:
+                if verify is None or verify(roots):
+                    report.update(path=path, rows=i + 1)
+                    yield roots
+                    if verify is not None:
+                        return
+
+
+def find_roots(pr, polynomials, method="groebner", verify=None, report=None):
     """
     Returns a generator generating all roots of a polynomial in some unknowns.
     The method used depends on the method parameter.
     :param pr: the polynomial ring
     :param polynomials: the reconstructed polynomials
-    :param method: the method to use, can be "groebner", "resultants", or "variety" (default: "groebner")
+    :param method: the method to use, can be "incremental", "groebner", "resultants", or "variety" (default: "groebner")
+    :param verify: a function checking a dict of roots, used by the incremental method to stop early (default: None)
+    :param report: a dict which gets the path that found the roots, see find_roots_incremental (default: None)
     :return: a generator generating dicts of (x0: x0root, x1: x1root, ...) entries
     """
+    report = {} if report is None else report
     if pr.ngens() == 1:
         logging.debug("Using univariate polynomial to find roots...")
+        report["path"] = "univariate"
         for polynomial in polynomials:
             yield from find_roots_univariate(pr.gen(), polynomial)
+    elif method == "incremental" and pr.ngens() == 2:
+        logging.debug("Using incremental resultants method to find roots...")
+        found = False
+        for roots in find_roots_incremental(pr, polynomials, verify, report):
+            found = True
+            yield roots
+        if not found:
+            # Every pair was tried, and pairs with a nonzero resultant have no common linear factor in both variables,
+            # so the pairwise gcds of find_roots_gcd would only repeat the candidates already rejected.
+            logging.debug("Incremental resultants method found no roots, falling back to the Groebner basis method...")
+            report["path"] = "groebner"
+            yield from find_roots_groebner(pr, polynomials)
     else:
+        report["path"] = method
         # Always try this method because it can find roots the others can't.
         yield from find_roots_gcd(pr, polynomials)
 
-        if method == "groebner":
+        if method in ["groebner", "incremental"]:
             logging.debug("Using Groebner basis method to find roots...")
             yield from find_roots_groebner(pr, polynomials)
         elif method == "resultants":
@@ -272,6 +578,118 @@ def find_roots(pr, polynomials, method="groebner"):
             yield from find_roots_variety(pr, polynomials)
 
 
+# The maximum number of lattice templates kept by lattice_template, read when the cache is first used.
+TEMPLATE_CACHE_SIZE = 16
+
+# The cache of lattice_template, rebuilt if TEMPLATE_CACHE_SIZE changed.
+_template_cache = None
+
+
+def lattice_template(m, t, N, bounds, homogeneous):
+    """
+    Returns the lattice template of _build_lattice_template, cached with at most TEMPLATE_CACHE_SIZE entries.
+    :return: a tuple of the exponents of the column monomials and, for every row, a list of (col, factor, i, k - i) entries
+    """
+    global _template_cache
+    if _template_cache is None or _template_cache.cache_parameters()["maxsize"] != TEMPLATE_CACHE_SIZE:
+        _template_cache = functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)(_build_lattice_template)
+    return _template_cache(m, t, N, bounds, homogeneous)
+
+
+def _build_lattice_template(m, t, N, bounds, homogeneous):
+    """
+    Computes the part of a lattice which does not depend on the coefficients of a linear homogeneous polynomial a * x + b * y.
+    The shifts are y^(m - k) * f^k * N^max(t - k, 0) if homogeneous is set, and y^j * f^k * N^max(t - k, 0) for j <= m - k otherwise.
+    Since f^k = sum binomial(k, i) * a^i * b^(k - i) * x^i * y^(k - i), every entry of the lattice is a constant factor
+    (binomial coefficient, power of N and column scaling) times a^i * b^(k - i).
+    The rows and columns are ordered so that the lattice is lower triangular.
+    :param m: the parameter m
+    :param t: the parameter t
+    :param N: the modulus
+    :param bounds: a tuple of the bounds on the x and y roots
+    :param homogeneous: set to true for the shifts of the homogeneous method
+    :return: a tuple of the exponents of the column monomials and, for every row, a list of (col, factor, i, k - i) entries
+    """
+    X, Y = ZZ(bounds[0]), ZZ(bounds[1])
+    N = ZZ(N)
+    if homogeneous:
+        shifts = [(k, m - k) for k in range(m + 1)]
+        exponents = [(i, m - i) for i in range(m + 1)]
+    else:
+        shifts = sorted(((k, j) for k in range(m + 1) for j in range(m + 1 - k)), key=lambda shift: (shift[0] + shift[1], shift[0]))
+        exponents = [(i, d - i) for d in range(m + 1) for i in range(d + 1)]
+
+    columns = {exponent: col for col, exponent in enumerate(exponents)}
+    scalings = [X ** i * Y ** l for i, l in exponents]
+    rows = []
+    for k, j in shifts:
+        power = N ** max(t - k, 0)
+        row = []
+        for i in range(k + 1):
+            col = columns[(i, k - i + j)]
+            row.append((col, binomial(k, i) * power * scalings[col], i, k - i))
+        rows.append(row)
+    return exponents, rows
+
+
+def create_lattice_linear(pr, a, b, N, m, t, bounds, homogeneous):
+    """
+    Creates the lattice of the shifts of a linear homogeneous polynomial a * x + b * y from a cached template.
+    Only the powers of a and b are computed for every polynomial, without any symbolic polynomial expansion.
+    :param pr: the polynomial ring
+    :param a: the coefficient of x
+    :param b: the coefficient of y
+    :param N: the modulus
+    :param m: the parameter m
+    :param t: the parameter t
+    :param bounds: the bounds on the x and y roots
+    :param homogeneous: set to true for the shifts of the homogeneous method
+    :return: a tuple of lattice and list of monomials
+    """
+    exponents, rows = lattice_template(m, t, N, tuple(bounds), homogeneous)
+    logging.debug(f"Creating a lattice with {len(rows)} shifts from a template ({_template_cache.cache_info()})...")
+    powers_a = [ZZ(1)]
+    powers_b = [ZZ(1)]
+    for _ in range(m):
+        powers_a.append(powers_a[-1] * a)
+        powers_b.append(powers_b[-1] * b)
+
+    ncols = len(exponents)
+    entries = [0] * (len(rows) * ncols)
+    for row, template_row in enumerate(rows):
+        for col, factor, i, j in template_row:
+            entries[row * ncols + col] = factor * powers_a[i] * powers_b[j]
+
+    L = matrix(ZZ, len(rows), ncols, entries)
+    x, y = pr.gens()
+    monomials = [x ** i * y ** l for i, l in exponents]
+    return L, monomials
+
+
+def _linear_coefficients(f):
+    """
+    Returns the coefficients of a linear homogeneous bivariate polynomial.
+    :param f: the polynomial
+    :return: a tuple (a, b) if f = a * x + b * y, else None
+    """
+    if f.parent().ngens() != 2 or not {tuple(exponent) for exponent in f.exponents()} <= {(1, 0), (0, 1)}:
+        return None
+    x, y = f.parent().gens()
+    return ZZ(f.monomial_coefficient(x)), ZZ(f.monomial_coefficient(y))
+
+
+def _normalize(f, al, N):
+    """
+    Normalizes a polynomial modulo N so that the coefficient al becomes 1.
+    :param f: the polynomial
+    :param al: the coefficient to normalize, coprime to N
+    :param N: the modulus
+    :return: the normalized polynomial with coefficients in [0, N)
+    """
+    inverse = mersenne.inverse_mod(al, N)
+    return f.map_coefficients(lambda coefficient: mersenne.mod(coefficient * inverse, N)).change_ring(ZZ)
+
+
 def _get_shifts(m, x, k, shift, j, sum, shifts):
     if j == len(x):
         shifts.append(shift)
@@ -280,7 +698,7 @@ def _get_shifts(m, x, k, shift, j, sum, shifts):
             _get_shifts(m, x, k, shift * x[j] ** ij, j + 1, sum + ij, shifts)
 
 
-def modular_multivariate(f, N, m, t, X, roots_method="groebner"):
+def modular_multivariate(f, N, m, t, X, roots_method="groebner", reduction_method=None, reduction_options=None):
     """
     Computes small modular roots of a multivariate polynomial.
     More information: Herrmann M., May A., "Solving Linear Equations Modulo Divisors: On Factoring Given Any Bits" (Section 3 and 4)
@@ -289,7 +707,9 @@ def modular_multivariate(f, N, m, t, X, roots_method="groebner"):
     :param m: the the parameter m
     :param t: the the parameter t
     :param X: a list of approximate bounds on the roots for each variable
-    :param roots_method: the method to use to find roots (default: "groebner")
+    :param roots_method: the method to use to find roots, see find_roots (default: "groebner")
+    :param reduction_method: the lattice reduction method, see reduce_lattice (default: None)
+    :param reduction_options: a dict of options for the lattice reduction method (default: None)
     :return: a generator generating small roots (tuples) of the polynomial
     """
     f = f.change_ring(ZZ)
@@ -304,27 +724,42 @@ def modular_multivariate(f, N, m, t, X, roots_method="groebner"):
 
     al = int(f.coefficient(l))
     assert gcd(al, N) == 1
-    f_ = (pow(al, -1, N) * f % N).change_ring(ZZ)
+    f_ = _normalize(f, al, N)
 
     logging.debug("Generating shifts...")
 
-    shifts = []
-    for k in range(m + 1):
-        _get_shifts(m, x, k, f_ ** k * N ** max(t - k, 0), 1, 0, shifts)
-
-    L, monomials = create_lattice(pr, shifts, X)
-    L = reduce_lattice(L)
-    polynomials = reconstruct_polynomials(L, f, N, monomials, X)
-    start_time = time.perf_counter()
-    solutions = find_roots(pr, polynomials, method=roots_method)
-    end_time = time.perf_counter()
-    solution_time = end_time - start_time
-    logging.info(f"Finding roots within {solution_time:.3f} seconds...")
-    for roots in solutions:
+    coefficients = _linear_coefficients(f_)
+    if coefficients is not None:
+        with instrumentation.span("build") as record:
+            L, monomials = create_lattice_linear(pr, *coefficients, N, m, t, X, False)
+            record["dimension"] = L.nrows()
+    else:
+        with instrumentation.span("shift_gen"):
+            shifts = []
+            for k in range(m + 1):
+                _get_shifts(m, x, k, f_ ** k * N ** max(t - k, 0), 1, 0, shifts)
+
+        with instrumentation.span("build") as record:
+            L, monomials = create_lattice(pr, shifts, X)
+            record["dimension"] = L.nrows()
+    L = reduce_lattice(L, method=reduction_method, bound=N ** t, **(reduction_options or {}))
+    with instrumentation.span("reconstruct"):
+        polynomials = reconstruct_polynomials(L, f, N, monomials, X)
+    report = {}
+    solutions = find_roots(pr, polynomials, method=roots_method, verify=lambda roots: mersenne.is_root(f, tuple(roots[xi] for xi in x), N), report=report)
+    while True:
+        with instrumentation.span("root_find", method=roots_method) as record:
+            start_time = time.perf_counter()
+            roots = next(solutions, None)
+            end_time = time.perf_counter()
+            record.update(report)
+        logging.info(f"Finding roots within {end_time - start_time:.3f} seconds...")
+        if roots is None:
+            return
         yield tuple(roots[xi] for xi in x)
 
 
-def modular_bivariate_homogeneous(f, N, m, t, X, Y, roots_method="groebner"):
+def modular_bivariate_homogeneous(f, N, m, t, X, Y, roots_method="groebner", reduction_method=None, reduction_options=None, roots_rows=3, warm_start=None):
     """
     Computes small modular roots of a bivariate polynomial.
     More information: Lu Y. et al., "Solving Linear Equations Modulo Unknown Divisors: Revisited (Theorem 7)
@@ -335,6 +770,10 @@ def modular_bivariate_homogeneous(f, N, m, t, X, Y, roots_method="groebner"):
     :param X: an approximate bound on the x roots
     :param Y: an approximate bound on the y roots
     :param roots_method: the method to use to find roots (default: "groebner")
+    :param reduction_method: the lattice reduction method, see reduce_lattice (default: None)
+    :param reduction_options: a dict of options for the lattice reduction method (default: None)
+    :param roots_rows: the number of reconstructed polynomials to try, stopping at the first verified root (default: 3)
+    :param warm_start: a dict shared between calls with increasing m and t, holding the last reduced basis (default: None)
     :return: a generator generating small roots (tuples of x and y roots) of the polynomial
     """
     f = f.change_ring(ZZ)
@@ -343,33 +782,93 @@ def modular_bivariate_homogeneous(f, N, m, t, X, Y, roots_method="groebner"):
 
     al = int(f.coefficient(x))
     assert gcd(al, N) == 1
-    f_ = (pow(al, -1, N) * f % N).change_ring(ZZ)
+    f_ = _normalize(f, al, N)
 
     logging.debug("Generating shifts...")
 
-    shifts = []
-    for k in range(m + 1):
-        g = y ** (m - k) * f_ ** k * N ** max(t - k, 0)
-        shifts.append(g)
-
-    L, monomials = create_lattice(pr, shifts, [X, Y])
-    L = reduce_lattice(L)
-    polynomials = reconstruct_polynomials(L, f, N ** t, monomials, [X, Y])
-    start_time = time.perf_counter()
-    # solutions = find_roots(pr, polynomials, method=roots_method)
-    t = var('t')
-    g = polynomials[0].subs(x = t*y).subs(y = 1).simplify()
-    logging.debug(f"{g = }")
-    root_t = solve(g == 0, t, domain = QQ)
-    solutions = []
-    for xy in root_t:  
-        t0 = xy.rhs()
-        x0 = t0.numerator()
-        y0 = t0.denominator()
-        root = {x: x0, y: y0}
-        solutions.append(root)
-    end_time = time.perf_counter()
+    coefficients = _linear_coefficients(f_)
+    if coefficients is not None:
+        with instrumentation.span("build") as record:
+            L, monomials = create_lattice_linear(pr, *coefficients, N, m, t, [X, Y], True)
+            record["dimension"] = L.nrows()
+            key = (N, X, Y, coefficients)
+            if warm_start is not None and warm_start.get("key") == key and (warm_start["m"], warm_start["t"]) == (m - 1, t - 1) and t >= m:
+                # The shifts for (m, t) are the shifts for (m - 1, t - 1) times y * N, plus f^m.
+                # Multiplying by y * N keeps the column of every x^i and scales it by N * Y,
+                # so the previously reduced basis generates all but the last row.
+                logging.debug(f"Warm starting from the reduced basis for m = {m - 1}...")
+                B = warm_start["basis"].augment(zero_vector(ZZ, m)) * (N * Y)
+                L = B.stack(L[m:])
+                record["warm_start"] = True
+    else:
+        key = None
+        with instrumentation.span("shift_gen"):
+            shifts = []
+            for k in range(m + 1):
+                g = y ** (m - k) * f_ ** k * N ** max(t - k, 0)
+                shifts.append(g)
+
+        with instrumentation.span("build") as record:
+            L, monomials = create_lattice(pr, shifts, [X, Y])
+            record["dimension"] = L.nrows()
+    L = reduce_lattice(L, method=reduction_method, bound=N ** t, **(reduction_options or {}))
+    if warm_start is not None and key is not None:
+        warm_start.update(key=key, m=m, t=t, basis=L)
+    with instrumentation.span("root_find"):
+        start_time = time.perf_counter()
+        # The polynomials are reconstructed lazily, so the rows after the one giving the root are never reconstructed.
+        polynomials = itertools.islice(iter_polynomials(L, f, N ** t, monomials, [X, Y]), roots_rows)
+        # solutions = find_roots(pr, polynomials, method=roots_method)
+        solutions = []
+        for row, polynomial in enumerate(polynomials):
+            for x0, y0 in find_roots_homogeneous(polynomial):
+                if mersenne.is_root(f, (x0, y0), N):
+                    logging.debug(f"Found root using polynomial at row {row}...")
+                    solutions.append((x0, y0))
+                    break
+
+            if len(solutions) > 0:
+                break
+        end_time = time.perf_counter()
     solution_time = end_time - start_time
     logging.info(f"Finding roots within {solution_time:.3f} seconds...")
-    for roots in solutions:
-        yield roots[x], roots[y]
\ No newline at end of file
+    yield from solutions
+
+
+def modular_bivariate_rational(f, N, X, Y):
+    """
+    Computes small modular roots of a linear homogeneous bivariate polynomial using rational reconstruction.
+    The root x0 / y0 is a convergent of the continued fraction of h / N, where f = x - h * y after normalization,
+    so the extended Euclidean algorithm on (N, h) is stopped at the first remainder below X.
+    The root is unique if 2 * X * Y < N.
+    More information: Wang P. S. et al., "P-adic Reconstruction of Rational Numbers"
+    :param f: the polynomial
+    :param N: the modulus
+    :param X: an approximate bound on the x roots
+    :param Y: an approximate bound on the y roots
+    :return: a generator generating small roots (tuples of x and y roots) of the polynomial
+    """
+    f = f.change_ring(ZZ)
+    x, y = f.parent().gens()
+
+    al = int(f.coefficient(x))
+    assert gcd(al, N) == 1
+    h = ZZ(mersenne.mod(-mersenne.inverse_mod(al, N) * int(f.monomial_coefficient(y)), N))
+
+    with instrumentation.span("root_find", dimension=2):
+        start_time = time.perf_counter()
+        # Invariant: r1 = t1 * h mod N, with |t1| growing while r1 shrinks.
+        r0, r1 = ZZ(N), h
+        t0, t1 = ZZ(0), ZZ(1)
+        while r1 >= X:
+            q = r0 // r1
+            r0, r1 = r1, r0 - q * r1
+            t0, t1 = t1, t0 - q * t1
+        end_time = time.perf_counter()
+    solution_time = end_time - start_time
+    logging.info(f"Finding roots by rational reconstruction within {solution_time:.3f} seconds...")
+
+    if t1 < 0:
+        r1, t1 = -r1, -t1
+    if r1 != 0 and t1 < Y:
+        yield r1, t1
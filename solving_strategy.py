@@ -1,11 +1,83 @@
+import math
 import logging
+import functools
 
 from sage.all import *
 
+import mersenne
 import small_roots
+import instrumentation
 
 
-def basic_attack(p, h, xi1, xi2, s=5):
+# The largest s tried by adaptive_attack.
+S_MAX = 20
+
+# The root finding method of the basic strategy, see small_roots.find_roots; "incremental" is opt-in until benchmarked.
+BASIC_ROOTS_METHOD = "groebner"
+
+
+# Set to round the bounds up to powers of two, so the column scalings of the lattices are shifts.
+POWER_OF_TWO_BOUNDS = False
+
+def _root_bound(p, xi):
+    """
+    Computes floor(p^xi) with 64 bits of precision beyond those of p, so the bound is exact for any xi
+    unless p^xi is within about 2^-64 of an integer.
+    :param p: the Mersenne prime
+    :param xi: the exponential parameter
+    :return: the bound
+    """
+    R = RealField(int(p).bit_length() + 64)
+    return int((R(p) ** R(xi)).floor())
+
+
+@functools.lru_cache(maxsize=None)
+def bounds(p, xi1, xi2, power_of_two=False):
+    """
+    Computes the bounds on the roots, cached since they only depend on the parameters.
+    :param p: the Mersenne prime
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :param power_of_two: set to true to round the bounds up to the next power of two (default: False)
+    :return: a tuple (X, Y) with X = p^xi1 and Y = p^xi2
+    """
+    X, Y = _root_bound(p, xi1), _root_bound(p, xi2)
+    if power_of_two:
+        X, Y = 1 << (X - 1).bit_length(), 1 << (Y - 1).bit_length()
+    return X, Y
+
+
+def precompute(p, xi1, xi2, s, strategy):
+    """
+    Computes everything an attack needs which does not depend on h: the bounds and the lattice template.
+    Calling this before forking worker processes lets all workers share the cached results.
+    :param p: the Mersenne prime
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :param s: the s value
+    :param strategy: the strategy, can be "basic", "improved", or "rational"
+    """
+    X, Y = bounds(p, xi1, xi2, POWER_OF_TWO_BOUNDS)
+    if strategy in ["basic", "improved"] and s != "auto":
+        small_roots.lattice_template(s, s, p, (X, Y), strategy == "improved")
+
+
+def _verify(f, x0, y0, p, s=None):
+    """
+    Checks that (x0, y0) is a root of f modulo p.
+    :param f: the polynomial
+    :param x0: the x root
+    :param y0: the y root
+    :param p: the modulus
+    :param s: the s value the root was found with, recorded in the verify span (default: None)
+    :return: True if f(x0, y0) = 0 (mod p)
+    """
+    with instrumentation.span("verify", s=s) as record:
+        record["success"] = mersenne.is_root(f, (x0, y0), p)
+        return record["success"]
+
+
+def basic_attack(p, h, xi1, xi2, s=5, reduction_method=None, reduction_options=None):
     """
     Recovers the small roots of a bivariate homogeneous equation.
     :param p: the Mersenne prime
@@ -13,22 +85,22 @@ def basic_attack(p, h, xi1, xi2, s=5):
     :param xi1: the exponential parameter for f
     :param xi2: the exponential parameter for g
     :param s: the s value to use for the small roots method (default: 3)
+    :param reduction_method: the lattice reduction method, see small_roots.reduce_lattice (default: None)
+    :param reduction_options: a dict of options for the lattice reduction method (default: None)
     :return: a tuple containing the roots
     """
     pr = ZZ["x", "y"]
     x, y = pr.gens()
     f = x - h * y
-    X = int(RR(p) ** xi1)
-    Y = int(RR(p) ** xi2)
+    X, Y = bounds(p, xi1, xi2, POWER_OF_TWO_BOUNDS)
     logging.info(f"Trying s = {s}...")
-    for x0, y0 in small_roots.modular_multivariate(f, p, s, s, [X, Y]):
-        z = int(f(x0, y0))
-        if z % p == 0:
+    for x0, y0 in small_roots.modular_multivariate(f, p, s, s, [X, Y], roots_method=BASIC_ROOTS_METHOD, reduction_method=reduction_method, reduction_options=reduction_options):
+        if _verify(f, x0, y0, p, s):
             return x0, y0
     return None, None
 
 
-def improved_attack(p, h, xi1, xi2, s=5):
+def improved_attack(p, h, xi1, xi2, s=5, reduction_method=None, reduction_options=None, warm_start=None):
     """
     Recovers the small roots of a bivariate homogeneous equation.
     :param p: the Mersenne prime
@@ -36,17 +108,144 @@ def improved_attack(p, h, xi1, xi2, s=5):
     :param xi1: the exponential parameter for f
     :param xi2: the exponential parameter for g
     :param s: the s value to use for the small roots method (default: 5)
+    :param reduction_method: the lattice reduction method, see small_roots.reduce_lattice (default: None)
+    :param reduction_options: a dict of options for the lattice reduction method (default: None)
+    :param warm_start: a dict shared between calls with increasing s, see small_roots.modular_bivariate_homogeneous (default: None)
     :return: a tuple containing the roots
     """
     pr = ZZ["x", "y"]
     x, y = pr.gens()
     f = x - h * y
-    X = int(RR(p) ** xi1)
-    Y = int(RR(p) ** xi2)
+    X, Y = bounds(p, xi1, xi2, POWER_OF_TWO_BOUNDS)
     logging.info(f"Trying s = {s}...")
-    for x0, y0 in small_roots.modular_bivariate_homogeneous(f, p, s, s, X, Y):
-        z = int(f(x0, y0))
-        if z % p == 0:
+    for x0, y0 in small_roots.modular_bivariate_homogeneous(f, p, s, s, X, Y, reduction_method=reduction_method, reduction_options=reduction_options, warm_start=warm_start):
+        if _verify(f, x0, y0, p, s):
+            return x0, y0
+    return None, None
+
+
+def rational_bounds(p, xi1, xi2):
+    """
+    Bounds f and g by their bit sizes floor(n * xi), see mlhrsp.generate_MLHRSP_instance, which is tighter than p^xi.
+    :param p: the Mersenne prime
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :return: a tuple (X, Y) with f < X and g < Y
+    """
+    n = int(p).bit_length()
+    return 2 ** int(n * xi1), 2 ** int(n * xi2)
+
+
+def rational_unique(p, xi1, xi2):
+    """
+    Checks whether rational reconstruction stopped at the first remainder below X is sure to find f / g,
+    which holds if 2 * X * g < p for the bounds of rational_bounds.
+    :param p: the Mersenne prime
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :return: True if rational reconstruction finds any root within the bounds
+    """
+    X, Y = rational_bounds(p, xi1, xi2)
+    return 2 * X * (Y - 1) < p
+
+
+def rational_attack(p, h, xi1, xi2, s=5, reduction_method=None, reduction_options=None):
+    """
+    Recovers the small roots of a bivariate homogeneous equation using rational reconstruction.
+    Falls back to the improved strategy if the bit sizes of f and g are too large for the root to be unique, see rational_unique.
+    :param p: the Mersenne prime
+    :param h: the given known h
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :param s: the s value to use for the small roots method if falling back (default: 5)
+    :param reduction_method: the lattice reduction method, see small_roots.reduce_lattice (default: None)
+    :param reduction_options: a dict of options for the lattice reduction method (default: None)
+    :return: a tuple containing the roots
+    """
+    pr = ZZ["x", "y"]
+    x, y = pr.gens()
+    f = x - h * y
+    X, Y = rational_bounds(p, xi1, xi2)
+    for x0, y0 in small_roots.modular_bivariate_rational(f, p, X, Y):
+        if _verify(f, x0, y0, p, s):
+            return x0, y0
+    if rational_unique(p, xi1, xi2):
+        return None, None
+    logging.info("Bounds are too large for rational reconstruction, falling back to the improved strategy...")
+    return improved_attack(p, h, xi1, xi2, s, reduction_method, reduction_options)
+
+
+def _log2_lattice(n, xi1, xi2, s, strategy):
+    """
+    Estimates the size of the lattice of a strategy, assuming the roots have at most floor(n * xi) bits.
+    The lattices are triangular, so the determinant is the product of the diagonal N^(t - k) * X^k * Y^j.
+    :param n: the Mersenne exponent
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :param s: the s value
+    :param strategy: the strategy, can be "basic" or "improved"
+    :return: a tuple of log2 of the determinant and the dimension
+    """
+    a = int(n * xi1)
+    b = int(n * xi2)
+    if strategy == "basic":
+        diagonal = [(s - k, k, j) for k in range(s + 1) for j in range(s + 1 - k)]
+    else:
+        diagonal = [(s - k, k, s - k) for k in range(s + 1)]
+    return sum(e * n + k * a + j * b for e, k, j in diagonal), len(diagonal)
+
+
+def minimal_s(n, xi1, xi2, strategy, s_max=S_MAX):
+    """
+    Computes the smallest s for which the Howgrave-Graham condition det^(1 / dim) * sqrt(dim) < N^s holds.
+    :param n: the Mersenne exponent
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :param strategy: the strategy, can be "basic", "improved", or "rational"
+    :param s_max: the largest s to consider (default: S_MAX)
+    :return: the smallest s, or None if no s up to s_max satisfies the condition
+    """
+    if strategy == "rational":
+        return 1
+    for s in range(1, s_max + 1):
+        log2_det, dim = _log2_lattice(n, xi1, xi2, s, strategy)
+        if log2_det / dim + math.log2(dim) / 2 < s * n:
+            return s
+    return None
+
+
+def adaptive_attack(p, h, xi1, xi2, strategy="improved", s_start=None, s_max=S_MAX, reduction_method=None, reduction_options=None):
+    """
+    Recovers the small roots of a bivariate homogeneous equation, increasing s until a root is verified.
+    The improved strategy warm starts every lattice from the reduced basis of the previous s.
+    :param p: the Mersenne prime
+    :param h: the given known h
+    :param xi1: the exponential parameter for f
+    :param xi2: the exponential parameter for g
+    :param strategy: the strategy to use, can be "basic", "improved", or "rational" (default: "improved")
+    :param s_start: the first s to try (default: the theoretical minimum, see minimal_s, or s_max if there is none)
+    :param s_max: the largest s to try (default: S_MAX)
+    :param reduction_method: the lattice reduction method, see small_roots.reduce_lattice (default: None)
+    :param reduction_options: a dict of options for the lattice reduction method (default: None)
+    :return: a tuple containing the roots
+    """
+    if s_start is None:
+        s_start = minimal_s(int(p).bit_length(), xi1, xi2, strategy, s_max)
+    if s_start is None:
+        logging.warning(f"No s up to {s_max} satisfies the Howgrave-Graham condition, only trying s = {s_max}...")
+        s_start = s_max
+    warm_start = {}
+    for s in range(s_start, s_max + 1):
+        if strategy == "basic":
+            x0, y0 = basic_attack(p, h, xi1, xi2, s, reduction_method, reduction_options)
+        elif strategy == "improved":
+            x0, y0 = improved_attack(p, h, xi1, xi2, s, reduction_method, reduction_options, warm_start)
+        else:
+            x0, y0 = rational_attack(p, h, xi1, xi2, s, reduction_method, reduction_options)
+        if x0 is not None:
+            logging.info(f"Found roots with s = {s}...")
             return x0, y0
+        if strategy == "rational" and rational_unique(p, xi1, xi2):
+            # Without a fallback to the improved strategy, the rational reconstruction does not depend on s.
+            break
     return None, None
-    
\ No newline at end of file
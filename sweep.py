@@ -0,0 +1,262 @@
+import json
+import time
+import hashlib
+import logging
+import argparse
+import itertools
+import multiprocessing
+
+import attack
+import instrumentation
+
+
+def cell_key(params):
+    """
+    Returns the key identifying a cell of a parameter sweep.
+    :param params: a dict with the n, w, xi1, xi2, s and strategy of the cell
+    :return: a tuple (n, w, xi1, xi2, s, strategy)
+    """
+    return params["n"], params["w"], params["xi1"], params["xi2"], params["s"], params["strategy"]
+
+
+def trial_seed(base_seed, params, trial):
+    """
+    Derives the instance seed of a trial, so a restarted sweep regenerates the same instances.
+    :param base_seed: the seed of the whole sweep
+    :param params: the parameters of the cell
+    :param trial: the index of the trial in the cell
+    :return: a 64-bit seed
+    """
+    data = f"{base_seed}:{cell_key(params)}:{trial}".encode()
+    return int.from_bytes(hashlib.sha256(data).digest()[:8], "little")
+
+
+def expand_grid(ns, ws, xis, ss, strategies):
+    """
+    Expands lists of parameter values into the parameter sets of a grid.
+    :param ns: the Mersenne exponents
+    :param ws: the Hamming weights
+    :param xis: the (xi1, xi2) pairs
+    :param ss: the s values
+    :param strategies: the solving strategies
+    :return: a list of dicts with the n, w, xi1, xi2, s and strategy of every cell
+    """
+    grid = []
+    for n, w, (xi1, xi2), s, strategy in itertools.product(ns, ws, xis, ss, strategies):
+        grid.append({"n": n, "w": w, "xi1": xi1, "xi2": xi2, "s": s, "strategy": strategy})
+    return grid
+
+
+class ResultStore:
+    """
+    An append-only JSONL store of per-trial records, safe to reopen after a crash.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._truncate_partial_line()
+
+    def _truncate_partial_line(self):
+        """
+        Truncates a partially written last line left by a crash, so the next record starts on its own line.
+        """
+        try:
+            with open(self.path, "rb+") as file:
+                size = file.seek(0, 2)
+                if size == 0:
+                    return
+                file.seek(size - 1)
+                if file.read(1) == b"\n":
+                    return
+                file.seek(0)
+                logging.warning(f"Truncating a partially written record in {self.path}...")
+                file.truncate(file.read().rfind(b"\n") + 1)
+        except FileNotFoundError:
+            pass
+
+    def records(self):
+        """
+        Returns all complete records in the store, skipping a partially written last line.
+        :return: a list of dicts
+        """
+        records = []
+        try:
+            with open(self.path) as file:
+                for line in file:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        logging.warning(f"Skipping a corrupted record in {self.path}...")
+        except FileNotFoundError:
+            pass
+        return records
+
+    def completed(self):
+        """
+        Returns the trials already recorded in the store.
+        :return: a set of (cell key, trial) tuples
+        """
+        return {(cell_key(record), record["trial"]) for record in self.records()}
+
+    def append(self, record):
+        """
+        Appends a record to the store and flushes it to disk.
+        :param record: the record
+        """
+        with open(self.path, "a") as file:
+            file.write(json.dumps(record) + "\n")
+            file.flush()
+
+
+def run_task(task):
+    """
+    Runs a single trial of a sweep.
+    :param task: a dict with the cell parameters, the trial index and the instance seed
+    :return: the record of the trial
+    """
+    # The reduction method is planned like in attack.py, so the records match single trials with the same parameters.
+    _, reduction_method = attack.plan_trial(task["n"], task["xi1"], task["xi2"], task["s"], task["strategy"])
+    result, test_time, spans = attack.run_trial(task["n"], task["w"], task["xi1"], task["xi2"], task["s"], task["strategy"], task["seed"], reduction_method)
+    stages = instrumentation.summary(spans)
+    record = dict(task)
+    record["success"] = bool(result)
+    record["time"] = test_time
+    record["lattice_dimension"] = stages.get("reduce", stages.get("root_find", {})).get("dimension")
+    record["reduce_time"] = stages.get("reduce", {}).get("time")
+    record["root_time"] = stages.get("root_find", {}).get("time")
+    record["stages"] = {name: stage["time"] for name, stage in stages.items()}
+    return record
+
+
+def make_tasks(grid, trials, base_seed=0, completed=()):
+    """
+    Creates the tasks of all trials of a parameter grid.
+    :param grid: a list of dicts with the n, w, xi1, xi2, s and strategy of every cell
+    :param trials: the number of trials per cell
+    :param base_seed: the seed of the whole sweep (default: 0)
+    :param completed: the (cell key, trial) tuples to skip (default: ())
+    :return: a list of dicts with the cell parameters, the trial index and the instance seed
+    """
+    tasks = []
+    for params in grid:
+        for trial in range(trials):
+            if (cell_key(params), trial) in completed:
+                continue
+            task = dict(params)
+            task["trial"] = trial
+            task["seed"] = trial_seed(base_seed, params, trial)
+            tasks.append(task)
+    return tasks
+
+
+def run_sweep(grid, trials, store, base_seed=0, jobs=1):
+    """
+    Runs all trials of a parameter grid which are not yet in the store.
+    :param grid: a list of dicts with the n, w, xi1, xi2, s and strategy of every cell
+    :param trials: the number of trials per cell
+    :param store: the result store
+    :param base_seed: the seed of the whole sweep (default: 0)
+    :param jobs: the number of worker processes (default: 1)
+    :return: the number of trials run
+    """
+    tasks = make_tasks(grid, trials, base_seed, store.completed())
+
+    logging.info(f"Sweeping {len(grid)} cells with {trials} trials each, {len(tasks)} trials left...")
+    stack_sizes = attack.grid_stack_sizes(grid, jobs)
+    if jobs == 1:
+        attack._init_worker(*stack_sizes)
+        for task in tasks:
+            store.append(run_task(task))
+    else:
+        context = multiprocessing.get_context("fork")
+        with context.Pool(jobs, initializer=attack._init_worker, initargs=stack_sizes) as pool:
+            for record in pool.imap_unordered(run_task, tasks):
+                store.append(record)
+    return len(tasks)
+
+
+def summarize(grid, store):
+    """
+    Computes the success rate and average time of every cell from the store.
+    :param grid: a list of dicts with the n, w, xi1, xi2, s and strategy of every cell
+    :param store: the result store
+    :return: a list of (params, trials, success rate, average time of successes) tuples
+    """
+    records = {}
+    for record in store.records():
+        records.setdefault(cell_key(record), []).append(record)
+
+    summary = []
+    for params in grid:
+        cell = records.get(cell_key(params), [])
+        successes = [record["time"] for record in cell if record["success"]]
+        success_rate = len(successes) / len(cell) if cell else 0
+        avg_time = sum(successes) / len(successes) if successes else None
+        summary.append((params, len(cell), success_rate, avg_time))
+    return summary
+
+
+def _parse_xi(value):
+    xi1, xi2 = value.split(":")
+    return float(xi1), float(xi2)
+
+
+def add_grid_arguments(parser):
+    """
+    Adds the arguments describing a parameter grid to a parser.
+    :param parser: the argument parser
+    """
+    parser.add_argument("--grid", help="a JSON file with a list of parameter sets (keys n, w, xi1, xi2, s, strategy)")
+    parser.add_argument("--n", type=int, nargs="+", default=[521], help="the Mersenne exponents")
+    parser.add_argument("--w", type=int, nargs="+", default=[10], help="the Hamming weights")
+    parser.add_argument("--xi", type=_parse_xi, nargs="+", default=[(0.5, 0.5)], help="the xi1:xi2 pairs")
+    parser.add_argument("--s", type=int, nargs="+", default=[5], help="the s values")
+    parser.add_argument("--strategy", nargs="+", default=["basic"], help="the solving strategies")
+    parser.add_argument("--trials", type=int, default=5, help="the number of trials per cell (default: 5)")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the whole sweep (default: 0)")
+
+
+def grid_from_arguments(args):
+    """
+    Builds the parameter grid from the parsed arguments, see add_grid_arguments.
+    :param args: the parsed arguments
+    :return: a list of dicts with the n, w, xi1, xi2, s and strategy of every cell
+    """
+    if args.grid is not None:
+        with open(args.grid) as file:
+            return json.load(file)
+    return expand_grid(args.n, args.w, args.xi, args.s, args.strategy)
+
+
+def print_summary(grid, store):
+    """
+    Prints the success rate and average time of every cell, see summarize.
+    :param grid: a list of dicts with the n, w, xi1, xi2, s and strategy of every cell
+    :param store: the result store
+    """
+    for params, trials, success_rate, avg_time in summarize(grid, store):
+        n, w, xi1, xi2, s, strategy = cell_key(params)
+        print(f"Success rate for n={n}, w={w}, xi1={xi1}, xi2={xi2} using s={s} and {strategy} strategy is {success_rate*100}% over {trials} trials...")
+        if avg_time is not None:
+            print(f"Average time is {avg_time:.3f} seconds...")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable parameter sweeps of the MLHRSP attacks.")
+    parser.add_argument("store", help="the JSONL file the per-trial records are appended to")
+    add_grid_arguments(parser)
+    parser.add_argument("--jobs", type=int, default=1, help="the number of worker processes (default: 1)")
+    args = parser.parse_args()
+    attack.configure()
+
+    grid = grid_from_arguments(args)
+    store = ResultStore(args.store)
+    start_time = time.perf_counter()
+    count = run_sweep(grid, args.trials, store, args.seed, args.jobs)
+    end_time = time.perf_counter()
+    print(f"Ran {count} trials within {end_time - start_time:.3f} seconds...")
+    print_summary(grid, store)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+import json
+import time
+import sqlite3
+import secrets
+import contextlib
+import logging
+import argparse
+import threading
+import multiprocessing
+import multiprocessing.connection
+
+import attack
+import sweep
+import planner
+
+# The time in seconds a worker holds a task before it is handed to another worker, unless the worker renews the lease.
+LEASE_TIME = 300
+
+# The time in seconds between polls of an empty queue.
+POLL_INTERVAL = 5
+
+# The number of times a task is claimed before it is marked as failed, so a task crashing every worker is given up.
+MAX_ATTEMPTS = 3
+
+
+def task_key(task):
+    """
+    Returns the key identifying a task in a queue, so enqueueing a sweep twice does not duplicate it.
+    :param task: a dict with the cell parameters and the trial index
+    :return: a string key
+    """
+    return json.dumps([*sweep.cell_key(task), task["trial"]])
+
+
+class SQLiteQueue:
+    """
+    A task queue in an SQLite file, shared by all processes (and nodes on a shared file system) that open it.
+    A claimed task is leased to a worker, and handed to another worker if the lease expires before the task completes.
+    A task which fails or loses its lease MAX_ATTEMPTS times is marked as failed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS tasks (key TEXT PRIMARY KEY, task TEXT, state TEXT, lease_until REAL, attempts INTEGER, record TEXT)")
+
+    def _connect(self):
+        return contextlib.closing(sqlite3.connect(self.path, timeout=60, isolation_level=None))
+
+    def put(self, tasks):
+        """
+        Enqueues tasks, skipping those already in the queue.
+        :param tasks: a list of task dicts
+        :return: the number of tasks enqueued
+        """
+        with self._connect() as connection:
+            cursor = connection.executemany("INSERT OR IGNORE INTO tasks VALUES (?, ?, 'pending', 0, 0, NULL)", [(task_key(task), json.dumps(task)) for task in tasks])
+            return cursor.rowcount
+
+    def claim(self, lease=LEASE_TIME):
+        """
+        Leases the next pending task, or a leased task whose lease expired.
+        :param lease: the lease time in seconds (default: LEASE_TIME)
+        :return: a tuple (key, task), or None if no task is available
+        """
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("UPDATE tasks SET state = 'failed' WHERE state = 'leased' AND lease_until < ? AND attempts >= ?", (now, MAX_ATTEMPTS))
+            row = connection.execute("SELECT key, task, attempts FROM tasks WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?) ORDER BY rowid LIMIT 1", (now,)).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            key, task, attempts = row
+            connection.execute("UPDATE tasks SET state = 'leased', lease_until = ?, attempts = attempts + 1 WHERE key = ?", (now + lease, key))
+            connection.execute("COMMIT")
+        if attempts > 0:
+            logging.warning(f"Retrying task {key} after a failure or an expired lease (attempt {attempts + 1})...")
+        return key, json.loads(task)
+
+    def renew(self, key, lease=LEASE_TIME):
+        """
+        Extends the lease of a running task.
+        :param key: the key of the task
+        :param lease: the lease time in seconds from now (default: LEASE_TIME)
+        """
+        with self._connect() as connection:
+            connection.execute("UPDATE tasks SET lease_until = ? WHERE key = ? AND state = 'leased'", (time.time() + lease, key))
+
+    def complete(self, key, record):
+        """
+        Stores the result of a task. A task completed twice (after an expired lease) keeps its first result.
+        :param key: the key of the task
+        :param record: the record of the trial, see sweep.run_task
+        """
+        with self._connect() as connection:
+            connection.execute("UPDATE tasks SET state = 'done', record = ? WHERE key = ? AND state != 'done'", (json.dumps(record), key))
+
+    def fail(self, key, error):
+        """
+        Records a failed run of a task, which is retried until it failed MAX_ATTEMPTS times.
+        :param key: the key of the task
+        :param error: a description of the error
+        """
+        with self._connect() as connection:
+            connection.execute("UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, record = ? WHERE key = ? AND state = 'leased'", (MAX_ATTEMPTS, json.dumps({"error": error}), key))
+
+    def done(self):
+        """
+        :return: True if no task is pending or leased, including if the queue is empty
+        """
+        with self._connect() as connection:
+            (remaining,) = connection.execute("SELECT COUNT(*) FROM tasks WHERE state IN ('pending', 'leased')").fetchone()
+        return remaining == 0
+
+    def failed(self):
+        """
+        :return: the keys of the failed tasks
+        """
+        with self._connect() as connection:
+            return [key for (key,) in connection.execute("SELECT key FROM tasks WHERE state = 'failed'")]
+
+    def records(self):
+        """
+        Returns the records of all completed tasks, so the queue can be summarized like a sweep.ResultStore.
+        :return: a list of dicts
+        """
+        with self._connect() as connection:
+            return [json.loads(record) for (record,) in connection.execute("SELECT record FROM tasks WHERE state = 'done'")]
+
+
+class Broker:
+    """
+    Serves a queue to workers on other nodes over a socket, using multiprocessing.connection.
+    """
+
+    METHODS = ["put", "claim", "renew", "complete", "fail", "done", "failed", "records"]
+
+    def __init__(self, queue, address, authkey):
+        self.queue = queue
+        self.listener = multiprocessing.connection.Listener(address, authkey=authkey.encode())
+
+    def serve_forever(self):
+        """
+        Accepts connections and serves each of them in its own thread.
+        """
+        logging.info(f"Serving the queue on {self.listener.address}...")
+        while True:
+            connection = self.listener.accept()
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        with connection:
+            while True:
+                try:
+                    method, args = connection.recv()
+                except EOFError:
+                    return
+                if method not in self.METHODS:
+                    connection.send(ValueError(f"Unknown method {method}"))
+                    continue
+                try:
+                    connection.send(getattr(self.queue, method)(*args))
+                except Exception as error:
+                    logging.exception(f"Broker call {method} failed")
+                    connection.send(error)
+
+
+class BrokerQueue:
+    """
+    A queue served by a Broker, with the same methods as SQLiteQueue.
+    """
+
+    def __init__(self, address, authkey):
+        self.connection = multiprocessing.connection.Client(address, authkey=authkey.encode())
+        self.lock = threading.Lock()
+
+    def _call(self, method, *args):
+        with self.lock:
+            self.connection.send((method, args))
+            result = self.connection.recv()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def put(self, tasks):
+        return self._call("put", tasks)
+
+    def claim(self, lease=LEASE_TIME):
+        return self._call("claim", lease)
+
+    def renew(self, key, lease=LEASE_TIME):
+        return self._call("renew", key, lease)
+
+    def complete(self, key, record):
+        return self._call("complete", key, record)
+
+    def fail(self, key, error):
+        return self._call("fail", key, error)
+
+    def done(self):
+        return self._call("done")
+
+    def failed(self):
+        return self._call("failed")
+
+    def records(self):
+        return self._call("records")
+
+
+def run_worker(queue, lease=LEASE_TIME):
+    """
+    Runs tasks from a queue until all tasks are done. A task raising an exception is recorded as failed, see SQLiteQueue.fail.
+    While a task runs, a background thread renews its lease, so only the tasks of a dead worker are handed out again.
+    :param queue: the queue
+    :param lease: the lease time in seconds (default: LEASE_TIME)
+    :return: the number of tasks run
+    """
+    count = 0
+    while True:
+        claimed = queue.claim(lease)
+        if claimed is None:
+            if queue.done():
+                return count
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        key, task = claimed
+        finished = threading.Event()
+
+        def renew():
+            while not finished.wait(lease / 3):
+                queue.renew(key, lease)
+
+        heartbeat = threading.Thread(target=renew, daemon=True)
+        heartbeat.start()
+        try:
+            record = sweep.run_task(task)
+        except Exception as error:
+            logging.exception(f"Task {key} failed")
+            queue.fail(key, repr(error))
+            continue
+        finally:
+            finished.set()
+            heartbeat.join()
+        queue.complete(key, record)
+        count += 1
+
+
+def _parse_address(value):
+    host, port = value.rsplit(":", 1)
+    return host, int(port)
+
+
+def open_queue(args):
+    """
+    Opens the queue given by the parsed arguments: a broker if --connect is set, else the SQLite file.
+    :param args: the parsed arguments
+    :return: the queue
+    """
+    if args.connect is not None:
+        return BrokerQueue(args.connect, args.authkey)
+    return SQLiteQueue(args.queue)
+
+
+def _worker_process(args, stack_size_max):
+    attack.configure()
+    # The cells of the tasks are only known when they are claimed, so the stack starts small and grows on demand.
+    attack._init_worker(planner.MIN_STACK_SIZE, max(planner.MIN_STACK_SIZE, stack_size_max))
+    count = run_worker(open_queue(args), args.lease)
+    logging.info(f"Worker finished after {count} tasks...")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed parameter sweeps of the MLHRSP attacks through a shared task queue.")
+    roles = parser.add_subparsers(dest="role", required=True)
+
+    coordinator = roles.add_parser("coordinator", help="enqueue the trials of a sweep, optionally serve the queue, and report when all are done")
+    coordinator.add_argument("queue", help="the SQLite file of the queue")
+    sweep.add_grid_arguments(coordinator)
+    coordinator.add_argument("--serve", type=_parse_address, metavar="HOST:PORT", help="serve the queue to workers on other nodes")
+    coordinator.add_argument("--authkey", default=None, help="the authentication key of the broker (default: a random key, printed when serving)")
+
+    worker = roles.add_parser("worker", help="run trials from a queue until all are done")
+    worker.add_argument("queue", nargs="?", help="the SQLite file of the queue, if not connecting to a broker")
+    worker.add_argument("--connect", type=_parse_address, metavar="HOST:PORT", help="the address of the broker")
+    worker.add_argument("--authkey", default=None, help="the authentication key printed by the coordinator, required with --connect")
+    worker.add_argument("--jobs", type=int, default=1, help="the number of worker processes on this node (default: 1)")
+    worker.add_argument("--lease", type=float, default=LEASE_TIME, help=f"the lease time of a task in seconds (default: {LEASE_TIME})")
+    args = parser.parse_args()
+    attack.configure()
+
+    if args.role == "worker":
+        if args.queue is None and args.connect is None:
+            parser.error("A worker needs a queue file or --connect.")
+        if args.connect is not None and args.authkey is None:
+            parser.error("A worker connecting to a broker needs its --authkey.")
+        context = multiprocessing.get_context("fork")
+        processes = [context.Process(target=_worker_process, args=(args, attack.PARI_STACK_SIZE // args.jobs)) for _ in range(args.jobs)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        return
+
+    grid = sweep.grid_from_arguments(args)
+    queue = SQLiteQueue(args.queue)
+    count = queue.put(sweep.make_tasks(grid, args.trials, args.seed))
+    logging.info(f"Enqueued {count} new trials of {len(grid)} cells...")
+    if args.serve is not None:
+        # The broker unpickles what clients send, so it never serves with a guessable key.
+        authkey = args.authkey or secrets.token_hex(16)
+        if args.authkey is None:
+            print(f"Serving the queue with --authkey {authkey}")
+        threading.Thread(target=Broker(queue, args.serve, authkey).serve_forever, daemon=True).start()
+
+    start_time = time.perf_counter()
+    while not queue.done():
+        time.sleep(POLL_INTERVAL)
+    end_time = time.perf_counter()
+    print(f"Ran {count} trials within {end_time - start_time:.3f} seconds...")
+    failed = queue.failed()
+    if failed:
+        print(f"{len(failed)} trials failed after {MAX_ATTEMPTS} attempts, see the workers' logs...")
+    sweep.print_summary(grid, queue)
+
+
+if __name__ == "__main__":
+    main()